@@ -1,18 +1,123 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, make_response
 from ..services.ml_service import MLService
+from ..services.model_registry import ModelRegistry
+from ..services.metrics_service import MetricsService
+from ..services.profiling_service import ProfilingService
+from ..services.serialization_service import SerializationService, JSON_MIMETYPE
 from ..models.case import Case
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 import os
+import hmac
+import time
 from datetime import datetime
+from functools import wraps
 
 api = Blueprint('api', __name__)
 engine = create_engine(os.getenv('DATABASE_URL', 'sqlite:///justice_ai.db'))
 Session = sessionmaker(bind=engine)
 
-ml_service = MLService(os.getenv('MODEL_PATH', 'models/legal_bert_model'))
+model_registry = ModelRegistry(os.getenv('MODEL_REGISTRY_PATH', 'models/registry'))
+ml_service = MLService(
+    os.getenv('MODEL_PATH', 'models/legal_bert_model'),
+    student_path=os.getenv('STUDENT_MODEL_PATH', 'models/legal_bert_student'),
+    cascade_threshold=float(os.getenv('CASCADE_THRESHOLD', '0.9')),
+    exit_heads_path=os.getenv('EARLY_EXIT_HEADS_PATH', 'models/legal_bert_exit_heads.pt'),
+    exit_threshold=float(os.getenv('EARLY_EXIT_THRESHOLD', '0.9')),
+    registry=model_registry
+)
+# Optionally pick up newly promoted versions without an admin call
+if float(os.getenv('MODEL_WATCH_INTERVAL', '0')) > 0:
+    model_registry.watch(ml_service.swap_to, float(os.getenv('MODEL_WATCH_INTERVAL')))
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+
+def admin_authorized():
+    """Admin endpoints stay closed until ADMIN_TOKEN is set and sent in X-Admin-Token."""
+    token = request.headers.get('X-Admin-Token')
+    return bool(ADMIN_TOKEN) and token is not None and hmac.compare_digest(token, ADMIN_TOKEN)
+
+metrics_service = MetricsService()
+
+serialization_service = SerializationService(
+    compression_min_size=int(os.getenv('COMPRESSION_MIN_SIZE', '1024')),
+    compression_level=int(os.getenv('COMPRESSION_LEVEL', '6'))
+)
+HISTORY_MAX_LIMIT = int(os.getenv('HISTORY_MAX_LIMIT', '1000'))
+
+def negotiated_response(payload, status=200, tabular=False):
+    """Serialize a payload in the format picked from the Accept header (JSON by default)."""
+    formats = serialization_service.available_formats(tabular=tabular)
+    mimetype = request.accept_mimetypes.best_match(formats, default=JSON_MIMETYPE)
+    if mimetype == JSON_MIMETYPE:
+        response = make_response(jsonify(payload), status)
+    else:
+        response = Response(serialization_service.encode(payload, mimetype), status, mimetype=mimetype)
+    response.vary.add('Accept')
+    return response
+
+@api.after_request
+def compress_response(response):
+    """Compress response bodies with gzip or brotli when the client accepts it."""
+    if response.direct_passthrough or 'Content-Encoding' in response.headers:
+        return response
+    
+    response.vary.add('Accept-Encoding')
+    encoding = request.accept_encodings.best_match(serialization_service.available_encodings())
+    if not encoding:
+        return response
+    
+    data, applied = serialization_service.compress(response.get_data(), encoding)
+    if applied:
+        response.set_data(data)
+        response.headers['Content-Encoding'] = applied
+    return response
+
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+profiling_service = ProfilingService(
+    os.getenv('PROFILE_DIR', 'profiles'),
+    token=os.getenv('PROFILING_TOKEN')
+)
+
+def profiled(name):
+    """Profile a request when it carries an X-Profile header.
+    
+    When profiling is disabled the view is returned unwrapped, so the normal
+    request path is untouched. Profiling requires PROFILING_TOKEN to be set
+    and sent in X-Profile-Token.
+    """
+    def decorator(view):
+        if not PROFILING_ENABLED:
+            return view
+        
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            header = request.headers.get('X-Profile')
+            if not header:
+                return view(*args, **kwargs)
+            if not profiling_service.is_authorized(request.headers.get('X-Profile-Token')):
+                return jsonify({'error': 'Invalid profiling token'}), 403
+            
+            modes = profiling_service.parse_modes(header)
+            if not modes:
+                return view(*args, **kwargs)
+            
+            # The torch profiler is process-global, so only one profile runs at a time
+            if not profiling_service.lock.acquire(blocking=False):
+                return jsonify({'error': 'Another request is being profiled'}), 409
+            try:
+                with profiling_service.profile(name, modes) as profile_id:
+                    response = make_response(view(*args, **kwargs))
+                response.headers['X-Profile-Id'] = profile_id
+                return response
+            except Exception as e:
+                return jsonify({'error': f'Profiling failed: {e}'}), 500
+            finally:
+                profiling_service.lock.release()
+        return wrapper
+    return decorator
 
 @api.route('/predict', methods=['POST'])
+@profiled('predict')
 def predict_verdict():
     """Endpoint for predicting verdict based on case details."""
     try:
@@ -21,9 +126,11 @@ def predict_verdict():
         if not data or 'description' not in data:
             return jsonify({'error': 'Missing required fields'}), 400
             
-        verdict, confidence = ml_service.predict(data['description'])
+        with metrics_service.timed('predict.inference'):
+            verdict, confidence, model_version = ml_service.predict_with_version(data['description'])
         
         # Create new case record
+        db_start = time.perf_counter()
         session = Session()
         new_case = Case(
             case_number=data.get('case_number', f'CASE-{datetime.now().strftime("%Y%m%d%H%M%S")}'),
@@ -35,6 +142,8 @@ def predict_verdict():
             verdict=verdict,
             confidence_score=confidence
         )
+        if hasattr(Case, 'model_version'):
+            new_case.model_version = model_version
         
         session.add(new_case)
         session.commit()
@@ -43,16 +152,19 @@ def predict_verdict():
             'case_id': new_case.id,
             'verdict': verdict,
             'confidence': confidence,
+            'model_version': model_version,
             'case_number': new_case.case_number
         }
         
         session.close()
+        metrics_service.record('predict.db_write', time.perf_counter() - db_start)
         return jsonify(response), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @api.route('/analyze-document', methods=['POST'])
+@profiled('analyze_document')
 def analyze_document():
     """Endpoint for analyzing legal documents."""
     try:
@@ -67,7 +179,8 @@ def analyze_document():
         content = file.read().decode('utf-8')
         
         # Analyze document
-        analysis = ml_service.analyze_document(content)
+        with metrics_service.timed('analyze_document.inference'):
+            analysis = ml_service.analyze_document(content)
         
         return jsonify(analysis), 200
         
@@ -94,15 +207,110 @@ def get_case(case_id):
 
 @api.route('/history', methods=['GET'])
 def get_history():
-    """Get prediction history."""
+    """Get prediction history.
+    
+    Supports `limit`/`offset` paging and a comma-separated `fields` projection.
+    The Accept header selects JSON, MessagePack or an Arrow IPC stream.
+    """
     try:
+        limit = min(max(request.args.get('limit', 10, type=int), 1), HISTORY_MAX_LIMIT)
+        offset = max(request.args.get('offset', 0, type=int), 0)
+        fields = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()]
+        
         session = Session()
-        cases = session.query(Case).order_by(Case.created_at.desc()).limit(10).all()
+        cases = (session.query(Case)
+                 .order_by(Case.created_at.desc())
+                 .offset(offset)
+                 .limit(limit)
+                 .all())
         
-        response = [case.to_dict() for case in cases]
+        response = serialization_service.select_fields([case.to_dict() for case in cases], fields)
         session.close()
         
+        return negotiated_response(response, 200, tabular=True)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/stats', methods=['GET'])
+def get_stats():
+    """Get inference statistics for the model cascade, early exit and request stages."""
+    try:
+        response = {
+            'cascade': ml_service.get_cascade_stats(),
+            'early_exit': ml_service.get_exit_stats(),
+            'stages': metrics_service.get_stage_stats()
+        }
+        
+        return jsonify(response), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/profiles', methods=['GET'])
+def get_profiles():
+    """List saved request profiles."""
+    try:
+        if not PROFILING_ENABLED:
+            return jsonify({'error': 'Profiling is disabled'}), 404
+        if not profiling_service.is_authorized(request.headers.get('X-Profile-Token')):
+            return jsonify({'error': 'Invalid profiling token'}), 403
+        
+        response = {
+            'output_dir': profiling_service.output_dir,
+            'profiles': profiling_service.list_profiles()
+        }
+        
         return jsonify(response), 200
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500 
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/admin/model', methods=['GET'])
+def get_model_status():
+    """Get the serving model version and hot-swap status."""
+    try:
+        if not admin_authorized():
+            return jsonify({'error': 'Invalid admin token'}), 403
+        
+        return jsonify(ml_service.get_model_status()), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/admin/model/reload', methods=['POST'])
+def reload_model():
+    """Load a registered model version in the background and swap it in.
+    
+    The registry's CURRENT pointer is only moved once the swap succeeds.
+    Pass `"force": true` to reload the version already being served.
+    """
+    try:
+        if not admin_authorized():
+            return jsonify({'error': 'Invalid admin token'}), 403
+        
+        data = request.get_json(silent=True) or {}
+        version = data.get('version') or model_registry.current_version()
+        if not version:
+            return jsonify({'error': 'No model version registered'}), 404
+        
+        # Raises ValueError for unknown versions
+        model_registry.version_path(version)
+        
+        force = bool(data.get('force'))
+        started = force or version != ml_service.model_version
+        if not ml_service.swap_to(version, force=force):
+            return jsonify({'error': 'A model swap is already in progress'}), 409
+        
+        response = {
+            'target': version,
+            'started': started,
+            'status': ml_service.get_model_status()
+        }
+        
+        return jsonify(response), 202 if started else 200
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
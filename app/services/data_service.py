@@ -1,6 +1,6 @@
 import pandas as pd
 import numpy as np
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple
 from sklearn.model_selection import train_test_split
 import json
 import os
@@ -11,6 +11,7 @@ class DataService:
         self.data_dir = data_dir
         self.raw_data_path = os.path.join(data_dir, 'raw')
         self.processed_data_path = os.path.join(data_dir, 'processed')
+        self.watermark_path = os.path.join(self.processed_data_path, 'training_watermark.json')
         self._ensure_directories()
         
     def _ensure_directories(self):
@@ -18,8 +19,8 @@ class DataService:
         os.makedirs(self.raw_data_path, exist_ok=True)
         os.makedirs(self.processed_data_path, exist_ok=True)
         
-    def prepare_training_data(self, cases: List[Dict]) -> Tuple[pd.DataFrame, pd.DataFrame]:
-        """Prepare training data from case records."""
+    def _to_frame(self, cases: List[Dict]) -> pd.DataFrame:
+        """Convert case records to a DataFrame with processed text and numerical labels."""
         # Convert cases to DataFrame
         df = pd.DataFrame(cases)
         
@@ -30,11 +31,19 @@ class DataService:
         verdict_map = {"Guilty": 0, "Not Guilty": 1, "Inconclusive": 2}
         df['label'] = df['verdict'].map(verdict_map)
         
+        return df
+    
+    def prepare_training_data(self, cases: List[Dict]) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Prepare training data from case records."""
+        if len(cases) < 2:
+            raise ValueError("At least 2 cases are needed to split training and validation data")
+        df = self._to_frame(cases)
+        
         # Check if we have enough samples per class for stratification
         label_counts = df['label'].value_counts()
         can_stratify = all(count >= 2 for count in label_counts)
         n_classes = len(label_counts)
-        test_size = max(int(0.2 * len(df)), n_classes) if can_stratify else int(0.2 * len(df))
+        test_size = max(int(0.2 * len(df)), n_classes) if can_stratify else max(int(0.2 * len(df)), 1)
         if test_size >= len(df):
             test_size = n_classes
         
@@ -56,6 +65,21 @@ class DataService:
         
         return train_df, val_df
     
+    def prepare_incremental_data(self, new_cases: List[Dict],
+                                 replay_cases: List[Dict]) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Prepare incremental training data without holding out any new case.
+        
+        The watermark marks every new case as seen once training succeeds, so
+        all of them are trained on. Validation uses the replayed older cases,
+        which the model has seen before, as a check against forgetting.
+        """
+        train_df = self._to_frame(new_cases + replay_cases)
+        if not replay_cases:
+            print("Warning: No replayed cases to validate on. Validating on the training cases.")
+            return train_df, train_df.copy()
+        
+        return train_df, self._to_frame(replay_cases)
+    
     def save_training_data(self, train_df: pd.DataFrame, val_df: pd.DataFrame):
         """Save processed training data."""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -87,6 +111,54 @@ class DataService:
         
         return train_df, val_df
     
+    def load_watermark(self) -> Optional[Dict]:
+        """Load the watermark written by the last successful training run."""
+        if not os.path.exists(self.watermark_path):
+            return None
+        with open(self.watermark_path) as f:
+            return json.load(f)
+    
+    def save_watermark(self, cases: List[Dict], model_version: str = None):
+        """Record which cases, and with which labels, the current model has seen."""
+        watermark = {
+            'updated_at': datetime.now().isoformat(),
+            'model_version': model_version,
+            'max_case_id': max((case['id'] for case in cases), default=0),
+            'labels': {str(case['id']): case['verdict'] for case in cases}
+        }
+        tmp_path = f"{self.watermark_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(watermark, f)
+        os.replace(tmp_path, self.watermark_path)
+    
+    def select_incremental_cases(self, cases: List[Dict], watermark: Dict,
+                                 replay_ratio: float = 0.5,
+                                 seed: int = 42) -> Tuple[List[Dict], List[Dict]]:
+        """Split cases into those added or relabelled since the watermark and a replay sample.
+        
+        The replay sample is drawn from the unchanged older cases, sized at
+        ``replay_ratio`` times the number of new cases, to limit forgetting.
+        """
+        seen_labels = watermark.get('labels', {})
+        max_case_id = watermark.get('max_case_id', 0)
+        
+        new_cases, old_cases = [], []
+        for case in cases:
+            previous_label = seen_labels.get(str(case['id']))
+            if case['id'] > max_case_id or previous_label is None or previous_label != case['verdict']:
+                new_cases.append(case)
+            else:
+                old_cases.append(case)
+        
+        replay_size = min(int(round(len(new_cases) * replay_ratio)), len(old_cases))
+        replay_cases = []
+        if replay_size > 0:
+            rng = np.random.default_rng(seed)
+            indices = rng.choice(len(old_cases), size=replay_size, replace=False)
+            replay_cases = [old_cases[i] for i in sorted(indices)]
+        
+        return new_cases, replay_cases
+    
     def _preprocess_text(self, text: str) -> str:
         """Clean and preprocess text data."""
         # Convert to lowercase
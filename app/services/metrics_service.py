@@ -0,0 +1,41 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+class MetricsService:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+    
+    @contextmanager
+    def timed(self, stage: str):
+        """Time the enclosed block and record it under `stage`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+    
+    def record(self, stage: str, seconds: float):
+        """Accumulate one timing sample for a request stage."""
+        with self._lock:
+            stats = self._stages.setdefault(stage, {'count': 0, 'total_time': 0.0, 'max_time': 0.0})
+            stats['count'] += 1
+            stats['total_time'] += seconds
+            stats['max_time'] = max(stats['max_time'], seconds)
+    
+    def get_stage_stats(self) -> Dict[str, Dict[str, float]]:
+        """Cumulative per-stage counts and timings in milliseconds."""
+        with self._lock:
+            stages = {name: dict(stats) for name, stats in self._stages.items()}
+        
+        return {
+            name: {
+                'count': stats['count'],
+                'total_ms': stats['total_time'] * 1000,
+                'avg_ms': stats['total_time'] / stats['count'] * 1000,
+                'max_ms': stats['max_time'] * 1000
+            }
+            for name, stats in stages.items()
+        }
@@ -1,17 +1,219 @@
+import os
+import threading
+import time
 import torch
+import torch.nn as nn
 from transformers import AutoTokenizer, AutoModelForSequenceClassification
 import numpy as np
-from typing import Dict, Any, Tuple
+from typing import Dict, Any, Optional, Tuple
+from .model_registry import ModelRegistry
+
+# Short synthetic inputs used to warm up a newly loaded model before it serves traffic
+WARMUP_TEXTS = [
+    "The plaintiff alleges breach of contract.",
+    "Multiple witnesses testified about the unsafe conditions, and documentation "
+    "shows repeated safety violations by the defendant over several years.",
+    " ".join(["The evidence presented to the court is contradictory and inconclusive."] * 20)
+]
+
+class ExitHead(nn.Module):
+    """Lightweight classifier on the [CLS] state of an intermediate encoder layer.
+    
+    Mirrors the BERT pooler + classifier so an exit head sees the same kind of
+    representation as the final classification head.
+    """
+    
+    def __init__(self, hidden_size: int, num_labels: int = 3):
+        super().__init__()
+        self.dense = nn.Linear(hidden_size, hidden_size)
+        self.activation = nn.Tanh()
+        self.classifier = nn.Linear(hidden_size, num_labels)
+    
+    def forward(self, hidden_states: torch.Tensor) -> torch.Tensor:
+        pooled = self.activation(self.dense(hidden_states[:, 0]))
+        return self.classifier(pooled)
+
+def load_exit_heads(path: str, device: torch.device) -> Dict[int, ExitHead]:
+    """Load exit heads saved by ``train_model.py --early-exit``, keyed by layer number."""
+    checkpoint = torch.load(path, map_location=device)
+    heads = {}
+    for layer, state_dict in checkpoint['heads'].items():
+        head = ExitHead(checkpoint['hidden_size'], checkpoint.get('num_labels', 3))
+        head.load_state_dict(state_dict)
+        head.to(device).eval()
+        heads[int(layer)] = head
+    return heads
+
+class ModelVersion:
+    """A loaded full model together with the exit heads and student trained for it."""
+    
+    def __init__(self, version: str, model, exit_heads: Optional[Dict[int, ExitHead]] = None,
+                 student_model=None):
+        self.version = version
+        self.model = model
+        self.exit_heads = exit_heads or {}
+        self.student_model = student_model
 
 class MLService:
-    def __init__(self, model_path: str):
+    def __init__(self, model_path: str, student_path: Optional[str] = None,
+                 cascade_threshold: float = 0.9, exit_heads_path: Optional[str] = None,
+                 exit_threshold: float = 0.9, registry: Optional[ModelRegistry] = None):
         self.device = torch.device('cpu')  # Force CPU usage
         self.tokenizer = AutoTokenizer.from_pretrained('nlpaueb/legal-bert-base-uncased')
-        self.model = AutoModelForSequenceClassification.from_pretrained(
-            'nlpaueb/legal-bert-base-uncased',
-            num_labels=3,  # Guilty, Not Guilty, Inconclusive
-            torch_dtype=torch.float32  # Use float32 for CPU
+        
+        # The serving model is held in a single ModelVersion reference. A swap
+        # replaces the reference, and each request pins the one it started with,
+        # so in-flight requests finish on the old version.
+        self.registry = registry
+        current = registry.current_version() if registry else None
+        if current:
+            self._active = self._load_version(current)
+        elif os.path.isdir(model_path):
+            # Fine-tuned weights saved by train_model.py; exit heads and the student
+            # are trained against this model, so they may be attached here
+            model = AutoModelForSequenceClassification.from_pretrained(
+                model_path,
+                torch_dtype=torch.float32
+            ).to(self.device)
+            model.eval()
+            exit_heads = None
+            if exit_heads_path and os.path.isfile(exit_heads_path):
+                exit_heads = load_exit_heads(exit_heads_path, self.device)
+            self._active = ModelVersion('local', model, exit_heads, self._load_student(student_path))
+        else:
+            # Untrained base checkpoint: exit heads would not match its hidden states,
+            # and a student would escalate to a model that cannot back it up
+            model = AutoModelForSequenceClassification.from_pretrained(
+                'nlpaueb/legal-bert-base-uncased',
+                num_labels=3,  # Guilty, Not Guilty, Inconclusive
+                torch_dtype=torch.float32  # Use float32 for CPU
+            ).to(self.device)
+            self._active = ModelVersion('base', model)
+        
+        self._swap_lock = threading.Lock()
+        self._swap_status = {'state': 'idle', 'target': None, 'error': None}
+        
+        # The cascade student and early-exit heads travel with the model version
+        self.cascade_threshold = cascade_threshold
+        self.exit_threshold = exit_threshold
+        
+        self._stats_lock = threading.Lock()
+        self._reset_stats()
+    
+    def _reset_stats(self):
+        """Start fresh exit and cascade counters for the serving version."""
+        self._exit_counts = {}
+        self._cascade_stats = {
+            'requests': 0,
+            'escalations': 0,
+            'student_calls': 0,
+            'student_time': 0.0,
+            'full_calls': 0,
+            'full_time': 0.0
+        }
+    
+    @property
+    def model(self):
+        return self._active.model
+    
+    @property
+    def exit_heads(self) -> Dict[int, ExitHead]:
+        return self._active.exit_heads
+    
+    @property
+    def student_model(self):
+        return self._active.student_model
+    
+    @property
+    def model_version(self) -> str:
+        return self._active.version
+    
+    def _load_student(self, path: Optional[str]):
+        """Load the distilled cascade student if one was saved at `path`.
+        
+        The student shares the legal-bert vocabulary, so the same tokenizer
+        output feeds both models.
+        """
+        if not path or not os.path.isdir(path):
+            return None
+        student = AutoModelForSequenceClassification.from_pretrained(
+            path,
+            torch_dtype=torch.float32
         ).to(self.device)
+        student.eval()
+        return student
+    
+    def _load_version(self, version: str) -> ModelVersion:
+        """Load a registered model version with the exit heads and student saved alongside it."""
+        path = self.registry.version_path(version)
+        model = AutoModelForSequenceClassification.from_pretrained(
+            path,
+            torch_dtype=torch.float32
+        ).to(self.device)
+        model.eval()
+        
+        exit_heads = None
+        heads_path = os.path.join(path, 'exit_heads.pt')
+        if os.path.isfile(heads_path):
+            exit_heads = load_exit_heads(heads_path, self.device)
+        student_model = self._load_student(os.path.join(path, 'student'))
+        return ModelVersion(version, model, exit_heads, student_model)
+    
+    def _warm_up(self, model_version: ModelVersion):
+        """Run a few synthetic forward passes so the first real request is not slow."""
+        for text in WARMUP_TEXTS:
+            inputs = self.preprocess_text(text)
+            self._classify(model_version.model, inputs)
+            if model_version.exit_heads:
+                self._classify_early_exit(model_version, inputs, record=False)
+            if model_version.student_model is not None:
+                self._classify(model_version.student_model, inputs)
+    
+    def swap_to(self, version: str, background: bool = True, force: bool = False) -> bool:
+        """Load, warm up and atomically activate a registered model version.
+        
+        The registry's CURRENT pointer only moves once the new version is
+        serving, so a version that fails to load never becomes the one the
+        next process boots with. Returns True if the version is already active
+        (unless ``force`` reloads it) or the swap was started, and False if
+        another swap is in progress.
+        """
+        if version == self.model_version and not force:
+            return True
+        if not self._swap_lock.acquire(blocking=False):
+            return False
+        self._swap_status = {'state': 'loading', 'target': version, 'error': None}
+        
+        def run():
+            try:
+                model_version = self._load_version(version)
+                self._warm_up(model_version)
+                # Stats describe the serving version's heads and student, so start over
+                with self._stats_lock:
+                    self._active = model_version
+                    self._reset_stats()
+                if self.registry:
+                    self.registry.set_current(version)
+                self._swap_status = {'state': 'idle', 'target': None, 'error': None}
+            except Exception as e:
+                self._swap_status = {'state': 'failed', 'target': version, 'error': str(e)}
+            finally:
+                self._swap_lock.release()
+        
+        if background:
+            threading.Thread(target=run, daemon=True, name=f'model-swap-{version}').start()
+        else:
+            run()
+        return True
+    
+    def get_model_status(self) -> Dict[str, Any]:
+        """Report the serving model version and any swap in progress."""
+        return {
+            'version': self.model_version,
+            'swap': dict(self._swap_status),
+            'registered_versions': self.registry.list_versions() if self.registry else [],
+            'registry_current': self.registry.current_version() if self.registry else None
+        }
         
     def preprocess_text(self, text: str) -> torch.Tensor:
         """Preprocess the input text for the model."""
@@ -26,10 +228,46 @@ class MLService:
     
     def predict(self, text: str) -> Tuple[str, float]:
         """Make a prediction based on the input text."""
+        verdict, confidence, _ = self.predict_with_version(text)
+        return verdict, confidence
+    
+    def predict_with_version(self, text: str) -> Tuple[str, float, str]:
+        """Make a prediction and report the model version that served it.
+        
+        When a student model is loaded it answers first, and the request is
+        escalated to the full model only if the student's confidence is below
+        ``cascade_threshold``. When exit heads are loaded, the full model stops
+        at the first layer whose head reaches ``exit_threshold``.
+        """
+        active = self._active  # Pin the version for the whole request
         inputs = self.preprocess_text(text)
+        escalated = False
+        student_time = None
+        
+        if active.student_model is not None:
+            start = time.perf_counter()
+            verdict, confidence = self._classify(active.student_model, inputs)
+            student_time = time.perf_counter() - start
+            
+            if confidence >= self.cascade_threshold:
+                self._record_cascade(active, student_time, None)
+                # Student answers are versioned separately from full-model answers
+                return verdict, confidence, f"{active.version}+student"
+            escalated = True
+        
+        start = time.perf_counter()
+        if active.exit_heads:
+            verdict, confidence = self._classify_early_exit(active, inputs)
+        else:
+            verdict, confidence = self._classify(active.model, inputs)
+        self._record_cascade(active, student_time, time.perf_counter() - start, escalated)
         
+        return verdict, confidence, active.version
+    
+    def _classify(self, model, inputs: Dict[str, torch.Tensor]) -> Tuple[str, float]:
+        """Run a single forward pass and return the verdict and its confidence."""
         with torch.no_grad():
-            outputs = self.model(**inputs)
+            outputs = model(**inputs)
             probabilities = torch.softmax(outputs.logits, dim=1)
             prediction = torch.argmax(probabilities, dim=1)
             confidence = probabilities[0][prediction].item()
@@ -39,9 +277,134 @@ class MLService:
         
         return verdict, confidence
     
+    def _classify_early_exit(self, model_version: ModelVersion, inputs: Dict[str, torch.Tensor],
+                             record: bool = True) -> Tuple[str, float]:
+        """Run the full model layer by layer, stopping at the first confident exit head."""
+        model = model_version.model
+        bert = model.bert
+        layers = bert.encoder.layer
+        verdict_map = {0: "Guilty", 1: "Not Guilty", 2: "Inconclusive"}
+        
+        with torch.no_grad():
+            attention_mask = bert.get_extended_attention_mask(
+                inputs['attention_mask'], inputs['input_ids'].shape
+            )
+            hidden_states = bert.embeddings(
+                input_ids=inputs['input_ids'],
+                token_type_ids=inputs.get('token_type_ids')
+            )
+            
+            for layer_num, layer in enumerate(layers, start=1):
+                hidden_states = layer(hidden_states, attention_mask=attention_mask)[0]
+                head = model_version.exit_heads.get(layer_num)
+                if head is None or layer_num == len(layers):
+                    continue
+                
+                probabilities = torch.softmax(head(hidden_states), dim=1)
+                confidence, prediction = torch.max(probabilities, dim=1)
+                if confidence.item() >= self.exit_threshold:
+                    if record:
+                        self._record_exit(model_version, layer_num)
+                    return verdict_map[prediction.item()], confidence.item()
+            
+            # No head was confident enough; finish with the model's own classifier
+            pooled = bert.pooler(hidden_states)
+            logits = model.classifier(model.dropout(pooled))
+            probabilities = torch.softmax(logits, dim=1)
+            confidence, prediction = torch.max(probabilities, dim=1)
+        
+        if record:
+            self._record_exit(model_version, len(layers))
+        return verdict_map[prediction.item()], confidence.item()
+    
+    def _record_exit(self, model_version: ModelVersion, layer_num: int):
+        """Count the encoder layer at which a request exited.
+        
+        Requests that finish on a version swapped out meanwhile are not counted.
+        """
+        with self._stats_lock:
+            if model_version is not self._active:
+                return
+            self._exit_counts[layer_num] = self._exit_counts.get(layer_num, 0) + 1
+    
+    def get_exit_stats(self) -> Dict[str, Any]:
+        """Report where requests exit the encoder when early exit is enabled."""
+        with self._stats_lock:
+            counts = dict(self._exit_counts)
+            active = self._active
+        
+        num_layers = active.model.config.num_hidden_layers
+        requests = sum(counts.values())
+        avg_exit_layer = (sum(layer * count for layer, count in counts.items()) / requests
+                          if requests else None)
+        
+        return {
+            'enabled': bool(active.exit_heads),
+            'threshold': self.exit_threshold,
+            'head_layers': sorted(active.exit_heads),
+            'requests': requests,
+            'exits_per_layer': {layer: counts[layer] for layer in sorted(counts)},
+            'exit_rate_per_layer': {layer: counts[layer] / requests for layer in sorted(counts)},
+            'avg_exit_layer': avg_exit_layer,
+            'avg_layers_skipped': num_layers - avg_exit_layer if requests else None
+        }
+    
+    def _record_cascade(self, model_version: ModelVersion, student_time: Optional[float],
+                        full_time: Optional[float], escalated: bool = False):
+        """Accumulate per-request cascade timings for the serving version."""
+        with self._stats_lock:
+            if model_version is not self._active:
+                return
+            stats = self._cascade_stats
+            stats['requests'] += 1
+            if escalated:
+                stats['escalations'] += 1
+            if student_time is not None:
+                stats['student_calls'] += 1
+                stats['student_time'] += student_time
+            if full_time is not None:
+                stats['full_calls'] += 1
+                stats['full_time'] += full_time
+    
+    def get_cascade_stats(self) -> Dict[str, Any]:
+        """Report the escalation rate and estimated latency savings of the cascade.
+        
+        Savings are estimated against a baseline where every request runs the
+        full model, using the mean full-model latency observed so far.
+        """
+        with self._stats_lock:
+            stats = dict(self._cascade_stats)
+            active = self._active
+        
+        requests = stats['requests']
+        avg_student_ms = (stats['student_time'] / stats['student_calls'] * 1000
+                          if stats['student_calls'] else None)
+        avg_full_ms = (stats['full_time'] / stats['full_calls'] * 1000
+                       if stats['full_calls'] else None)
+        
+        saved_ms = None
+        savings_pct = None
+        if avg_full_ms is not None and requests:
+            baseline_ms = requests * avg_full_ms
+            actual_ms = (stats['student_time'] + stats['full_time']) * 1000
+            saved_ms = baseline_ms - actual_ms
+            savings_pct = saved_ms / baseline_ms * 100
+        
+        return {
+            'enabled': active.student_model is not None,
+            'threshold': self.cascade_threshold,
+            'requests': requests,
+            'escalations': stats['escalations'],
+            'escalation_rate': stats['escalations'] / requests if requests else None,
+            'avg_student_latency_ms': avg_student_ms,
+            'avg_full_latency_ms': avg_full_ms,
+            'estimated_latency_saved_ms': saved_ms,
+            'estimated_latency_saved_pct': savings_pct
+        }
+    
     def analyze_document(self, document_text: str) -> Dict[str, Any]:
         """Analyze a legal document and return detailed insights."""
-        verdict, confidence = self.predict(document_text)
+        verdict, confidence, model_version = self.predict_with_version(document_text)
         
         # Extract key legal terms and their context
         # This is a simplified version - in production, you'd want more sophisticated analysis
@@ -50,6 +413,7 @@ class MLService:
         return {
             "verdict": verdict,
             "confidence": confidence,
+            "model_version": model_version,
             "key_legal_terms": legal_terms,
             "analysis_summary": self._generate_summary(document_text)
         }
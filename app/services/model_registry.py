@@ -0,0 +1,93 @@
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+from typing import Callable, List, Optional
+
+class ModelRegistry:
+    """Versioned model directories with an atomically updated CURRENT pointer.
+    
+    Layout::
+    
+        <root>/v20240101_120000/   saved model (config, weights, optional exit_heads.pt and student/)
+        <root>/v20240102_093000/
+        <root>/CURRENT             name of the version to serve
+    """
+    
+    def __init__(self, root: str = 'models/registry'):
+        self.root = root
+        self.current_file = os.path.join(root, 'CURRENT')
+        os.makedirs(root, exist_ok=True)
+    
+    def list_versions(self) -> List[str]:
+        """Registered versions, oldest first."""
+        return sorted(
+            name for name in os.listdir(self.root)
+            if name.startswith('v') and os.path.isdir(os.path.join(self.root, name))
+        )
+    
+    def version_path(self, version: str) -> str:
+        path = os.path.join(self.root, version)
+        if not os.path.isdir(path):
+            raise ValueError(f"Unknown model version: {version}")
+        return path
+    
+    def current_version(self) -> Optional[str]:
+        """The version named by CURRENT, or None if nothing has been promoted."""
+        try:
+            with open(self.current_file) as f:
+                version = f.read().strip()
+        except FileNotFoundError:
+            return None
+        return version or None
+    
+    def set_current(self, version: str):
+        """Point CURRENT at `version`; the rename keeps readers from seeing a partial write."""
+        self.version_path(version)
+        tmp_file = f"{self.current_file}.tmp"
+        with open(tmp_file, 'w') as f:
+            f.write(version)
+        os.replace(tmp_file, self.current_file)
+    
+    def register(self, source_dir: str, promote: bool = True) -> str:
+        """Copy a saved model directory into a new version and optionally promote it.
+        
+        The copy is staged under a temporary name and renamed into place, so a
+        watcher never observes a half-written version directory.
+        """
+        version = f"v{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        suffix = 1
+        while os.path.exists(os.path.join(self.root, version)):
+            version = f"v{datetime.now().strftime('%Y%m%d_%H%M%S')}_{suffix}"
+            suffix += 1
+        staging = os.path.join(self.root, f".staging_{version}")
+        shutil.copytree(source_dir, staging)
+        os.rename(staging, os.path.join(self.root, version))
+        
+        if promote:
+            self.set_current(version)
+        return version
+    
+    def watch(self, on_change: Callable[[str], bool], interval: float = 10.0) -> threading.Thread:
+        """Poll CURRENT in a daemon thread and call `on_change(version)` when it moves.
+        
+        A version is only marked as seen once `on_change` returns True, so a
+        change it could not act on (e.g. while another swap is running) is
+        retried on the next poll.
+        """
+        # Read the starting version before the thread starts, so a promotion
+        # right after watch() returns is not mistaken for the initial state
+        initial = self.current_version()
+        
+        def run():
+            last_seen = initial
+            while True:
+                time.sleep(interval)
+                version = self.current_version()
+                if version and version != last_seen and on_change(version):
+                    last_seen = version
+        
+        thread = threading.Thread(target=run, daemon=True, name='model-registry-watcher')
+        thread.start()
+        return thread
@@ -0,0 +1,125 @@
+import cProfile
+import hmac
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from datetime import datetime
+from typing import Dict, List
+
+PROFILE_MODES = ('cprofile', 'sample', 'torch')
+
+class StackSampler:
+    """Periodically samples one thread's Python stack into folded-stack counts.
+    
+    The output uses the collapsed format read by flamegraph.pl and speedscope:
+    one `frame;frame;frame count` line per distinct stack.
+    """
+    
+    def __init__(self, thread_id: int, interval: float = 0.001):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+    
+    def _run(self):
+        while not self._stop.is_set():
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.stacks[';'.join(reversed(stack))] += 1
+            time.sleep(self.interval)
+    
+    def start(self):
+        self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+    
+    def write(self, path: str):
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+class ProfilingService:
+    def __init__(self, output_dir: str = 'profiles', token: str = None):
+        self.output_dir = output_dir
+        self.token = token
+        # Held by the request being profiled; torch's profiler cannot be nested
+        self.lock = threading.Lock()
+    
+    def is_authorized(self, token: str) -> bool:
+        """Check the request's profiling token; profiling is refused when none is configured."""
+        return bool(self.token) and token is not None and hmac.compare_digest(token, self.token)
+    
+    def parse_modes(self, header_value: str) -> List[str]:
+        """Map an X-Profile header value to profiling modes.
+        
+        `1`/`true` selects sampling plus a torch trace; otherwise the value is a
+        comma-separated subset of PROFILE_MODES.
+        """
+        value = header_value.strip().lower()
+        if value in ('1', 'true', 'yes'):
+            return ['sample', 'torch']
+        return [mode for mode in (m.strip() for m in value.split(',')) if mode in PROFILE_MODES]
+    
+    @contextmanager
+    def profile(self, name: str, modes: List[str]):
+        """Profile the enclosed block and write the results under `output_dir`.
+        
+        Yields the profile id; files are named `<id>.<ext>`:
+        `.prof` (cProfile/pstats), `.folded` (sampled Python stacks),
+        `.torch.json` (Chrome trace) and `.torch.folded` (torch op stacks).
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        profile_id = f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}"
+        prefix = os.path.join(self.output_dir, profile_id)
+        
+        profiler = cProfile.Profile() if 'cprofile' in modes else None
+        sampler = StackSampler(threading.get_ident()) if 'sample' in modes else None
+        torch_profiler = None
+        
+        with ExitStack() as stack:
+            if 'torch' in modes:
+                from torch.profiler import profile, ProfilerActivity
+                torch_profiler = stack.enter_context(
+                    profile(activities=[ProfilerActivity.CPU], record_shapes=True, with_stack=True)
+                )
+            if sampler:
+                sampler.start()
+            if profiler:
+                profiler.enable()
+            try:
+                yield profile_id
+            finally:
+                if profiler:
+                    profiler.disable()
+                if sampler:
+                    sampler.stop()
+        
+        if profiler:
+            profiler.dump_stats(f"{prefix}.prof")
+        if sampler:
+            sampler.write(f"{prefix}.folded")
+        if torch_profiler:
+            torch_profiler.export_chrome_trace(f"{prefix}.torch.json")
+            torch_profiler.export_stacks(f"{prefix}.torch.folded", 'self_cpu_time_total')
+    
+    def list_profiles(self) -> Dict[str, List[str]]:
+        """Saved profile files grouped by profile id."""
+        if not os.path.isdir(self.output_dir):
+            return {}
+        
+        profiles = {}
+        for filename in sorted(os.listdir(self.output_dir)):
+            profile_id = filename.split('.', 1)[0]
+            profiles.setdefault(profile_id, []).append(filename)
+        return profiles
@@ -0,0 +1,84 @@
+import gzip
+import json
+from typing import Any, List, Optional, Tuple
+
+# Compact encodings and brotli are optional; formats whose library is missing
+# are simply not offered during content negotiation.
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPE = 'application/msgpack'
+ARROW_MIMETYPE = 'application/vnd.apache.arrow.stream'
+
+class SerializationService:
+    def __init__(self, compression_min_size: int = 1024, compression_level: int = 6):
+        self.compression_min_size = compression_min_size
+        self.compression_level = compression_level
+    
+    def available_formats(self, tabular: bool = False) -> List[str]:
+        """Response mimetypes this server can produce, JSON first as the default.
+        
+        Arrow IPC is columnar, so it is only offered for lists of records.
+        """
+        formats = [JSON_MIMETYPE]
+        if msgpack is not None:
+            formats.append(MSGPACK_MIMETYPE)
+        if tabular and pa is not None:
+            formats.append(ARROW_MIMETYPE)
+        return formats
+    
+    def available_encodings(self) -> List[str]:
+        """Content-Encodings this server can produce, in order of preference."""
+        return (['br'] if brotli is not None else []) + ['gzip']
+    
+    def encode(self, payload: Any, mimetype: str = JSON_MIMETYPE) -> bytes:
+        """Serialize a payload in the given format."""
+        if mimetype == MSGPACK_MIMETYPE:
+            return msgpack.packb(payload, use_bin_type=True, default=str)
+        if mimetype == ARROW_MIMETYPE:
+            return self._encode_arrow(payload)
+        return json.dumps(payload, separators=(',', ':'), default=str).encode('utf-8')
+    
+    def _encode_arrow(self, records: List[dict]) -> bytes:
+        """Encode a list of records as a single-batch Arrow IPC stream."""
+        table = pa.Table.from_pylist(records)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+    
+    def compress(self, data: bytes, encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+        """Compress `data` with the chosen Content-Encoding.
+        
+        Small bodies are returned unchanged, since compressing them costs more
+        CPU than it saves in bandwidth.
+        """
+        if not encoding or len(data) < self.compression_min_size:
+            return data, None
+        if encoding == 'br' and brotli is not None:
+            # Brotli quality runs 0-11; map the gzip-style level onto the same range
+            quality = min(11, round(self.compression_level * 11 / 9))
+            return brotli.compress(data, quality=quality), 'br'
+        if encoding == 'gzip':
+            return gzip.compress(data, compresslevel=self.compression_level), 'gzip'
+        return data, None
+    
+    @staticmethod
+    def select_fields(records: List[dict], fields: Optional[List[str]]) -> List[dict]:
+        """Project each record onto the requested fields."""
+        if not fields:
+            return records
+        return [{field: record[field] for field in fields if field in record} for record in records]
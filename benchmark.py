@@ -0,0 +1,348 @@
+import argparse
+import io
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+LEGAL_WORDS = [
+    "plaintiff", "defendant", "evidence", "testimony", "witness", "contract",
+    "breach", "liability", "jurisdiction", "negligence", "damages", "statute",
+    "court", "appeal", "verdict", "claims", "alleges", "agreement", "property",
+    "safety", "violation", "records", "expert", "opinion", "documents", "the",
+    "and", "of", "to", "was", "that", "failed", "provide", "argues", "shows"
+]
+
+APP_SUITES = ['tokenize', 'forward', 'predict', 'analyze_document', 'db_insert', 'history']
+SUITES = APP_SUITES + ['encode']
+
+FORMAT_NAMES = {
+    'application/json': 'json',
+    'application/msgpack': 'msgpack',
+    'application/vnd.apache.arrow.stream': 'arrow'
+}
+
+def synthetic_text(num_words: int, seed: int) -> str:
+    """Deterministic pseudo-legal text of roughly `num_words` words."""
+    rng = random.Random(seed)
+    words = [rng.choice(LEGAL_WORDS) for _ in range(num_words)]
+    sentences = [' '.join(words[i:i + 12]).capitalize() for i in range(0, len(words), 12)]
+    return '. '.join(sentences) + '.'
+
+def summarize(latencies, errors, wall_time):
+    """Latency percentiles (ms) and throughput for one benchmark run."""
+    if not latencies:
+        return {'count': 0, 'errors': errors}
+    arr = np.array(latencies) * 1000
+    return {
+        'count': len(latencies),
+        'errors': errors,
+        'mean_ms': float(arr.mean()),
+        'min_ms': float(arr.min()),
+        'p50_ms': float(np.percentile(arr, 50)),
+        'p95_ms': float(np.percentile(arr, 95)),
+        'p99_ms': float(np.percentile(arr, 99)),
+        'max_ms': float(arr.max()),
+        'throughput_rps': len(latencies) / wall_time if wall_time > 0 else None
+    }
+
+def run_timed(make_op, iterations, concurrency, warmup):
+    """Time `iterations` calls split across `concurrency` worker threads.
+    
+    `make_op` is called once per worker and returns the callable to time, so
+    each worker can hold its own non-thread-safe state (e.g. a test client).
+    An op may return False to count the call as an error.
+    """
+    per_worker = max(iterations // concurrency, 1)
+    
+    def worker(_):
+        op = make_op()
+        for _ in range(warmup):
+            op()
+        latencies, errors = [], 0
+        for _ in range(per_worker):
+            start = time.perf_counter()
+            ok = op()
+            latencies.append(time.perf_counter() - start)
+            if ok is False:
+                errors += 1
+        return latencies, errors
+    
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(worker, range(concurrency)))
+    wall_time = time.perf_counter() - start
+    
+    latencies = [lat for worker_lats, _ in results for lat in worker_lats]
+    errors = sum(worker_errors for _, worker_errors in results)
+    return summarize(latencies, errors, wall_time)
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def synthetic_case_records(count: int, seed: int):
+    """History-like case dicts shaped after Case.to_dict()."""
+    rng = random.Random(seed)
+    verdicts = ["Guilty", "Not Guilty", "Inconclusive"]
+    return [
+        {
+            'id': i + 1,
+            'case_number': f'CASE-BENCH{i:06d}',
+            'title': f'Benchmark Case {i}',
+            'description': synthetic_text(60, seed + i),
+            'plaintiff': 'Bench Plaintiff',
+            'defendant': 'Bench Defendant',
+            'case_type': rng.choice(['Contract', 'Property', 'Criminal']),
+            'verdict': rng.choice(verdicts),
+            'confidence_score': round(rng.random(), 4),
+            'created_at': datetime(2024, 1, 1).isoformat()
+        }
+        for i in range(count)
+    ]
+
+def build_encoding_cases(args):
+    """Yield encode benchmarks: every response format x compression over `sizes` history rows.
+    
+    Encoding is CPU-bound under the GIL, so these run at concurrency 1 only.
+    """
+    if 'encode' not in args.suites:
+        return
+    from app.services.serialization_service import SerializationService
+    
+    service = SerializationService(compression_min_size=0)
+    for rows in args.sizes:
+        records = synthetic_case_records(rows, args.seed)
+        for mimetype in service.available_formats(tabular=True):
+            for encoding in [None] + service.available_encodings():
+                body, _ = service.compress(service.encode(records, mimetype), encoding)
+                extra = {
+                    'format': FORMAT_NAMES[mimetype],
+                    'compression': encoding or 'identity',
+                    'payload_bytes': len(body)
+                }
+                suite = f"encode:{extra['format']}+{extra['compression']}"
+                def make_op(mimetype=mimetype, encoding=encoding, records=records):
+                    return lambda: service.compress(service.encode(records, mimetype), encoding)
+                yield suite, rows, 1, make_op, extra
+
+def build_cases(args):
+    """Yield (suite, size, concurrency, make_op) for every configured benchmark."""
+    if not set(args.suites) & set(APP_SUITES):
+        return
+    from run import create_app
+    from app.routes.api import ml_service, Session
+    from app.models.case import Case
+    
+    app = create_app()
+    app.config['TESTING'] = True
+    
+    for size in args.sizes:
+        text = synthetic_text(size, args.seed)
+        inputs = ml_service.preprocess_text(text)
+        
+        for concurrency in args.concurrency:
+            if 'tokenize' in args.suites:
+                yield 'tokenize', size, concurrency, lambda: (lambda: ml_service.preprocess_text(text))
+            
+            if 'forward' in args.suites:
+                yield 'forward', size, concurrency, lambda: (lambda: ml_service._classify(ml_service.model, inputs))
+            
+            if 'predict' in args.suites:
+                def make_predict():
+                    client = app.test_client()
+                    payload = {'title': 'Benchmark Case', 'description': text, 'case_type': 'Benchmark'}
+                    return lambda: client.post('/api/predict', json=payload).status_code == 200
+                yield 'predict', size, concurrency, make_predict
+            
+            if 'analyze_document' in args.suites:
+                def make_analyze():
+                    client = app.test_client()
+                    body = text.encode('utf-8')
+                    return lambda: client.post(
+                        '/api/analyze-document',
+                        data={'file': (io.BytesIO(body), 'bench.txt')},
+                        content_type='multipart/form-data'
+                    ).status_code == 200
+                yield 'analyze_document', size, concurrency, make_analyze
+            
+            if 'db_insert' in args.suites:
+                def make_insert():
+                    counter = iter(range(sys.maxsize))
+                    def insert():
+                        session = Session()
+                        session.add(Case(
+                            case_number=f'BENCH-{id(counter)}-{next(counter)}',
+                            title='Benchmark Case',
+                            description=text,
+                            plaintiff='Bench Plaintiff',
+                            defendant='Bench Defendant',
+                            case_type='Benchmark',
+                            verdict='Inconclusive',
+                            confidence_score=0.5
+                        ))
+                        session.commit()
+                        session.close()
+                    return insert
+                yield 'db_insert', size, concurrency, make_insert
+    
+    # History pages are sized by row count: `sizes` doubles as the page limit
+    if 'history' in args.suites:
+        seed_history(Session, Case, max(args.sizes), args.seed)
+        for size in args.sizes:
+            for concurrency in args.concurrency:
+                def make_history(size=size):
+                    client = app.test_client()
+                    return lambda: client.get(f'/api/history?limit={size}').status_code == 200
+                yield 'history', size, concurrency, make_history
+
+def seed_history(Session, Case, rows, seed):
+    """Make sure the benchmark database holds at least `rows` cases to page through."""
+    session = Session()
+    existing = session.query(Case).count()
+    for record in synthetic_case_records(rows, seed)[existing:]:
+        session.add(Case(
+            case_number=f"HIST-{record['case_number']}",
+            title=record['title'],
+            description=record['description'],
+            plaintiff=record['plaintiff'],
+            defendant=record['defendant'],
+            case_type=record['case_type'],
+            verdict=record['verdict'],
+            confidence_score=record['confidence_score']
+        ))
+    session.commit()
+    session.close()
+
+def model_metadata(args):
+    """The model setup loaded from disk, so baselines with different setups are not mixed up."""
+    if not set(args.suites) & set(APP_SUITES):
+        return None
+    from app.routes.api import ml_service
+    
+    cascade = ml_service.get_cascade_stats()
+    early_exit = ml_service.get_exit_stats()
+    return {
+        'model_version': ml_service.model_version,
+        'cascade_enabled': cascade['enabled'],
+        'cascade_threshold': cascade['threshold'],
+        'early_exit_enabled': early_exit['enabled'],
+        'early_exit_threshold': early_exit['threshold'],
+        'early_exit_layers': early_exit['head_layers']
+    }
+
+def compare(results, model, baseline_path, tolerance):
+    """Print p50 changes against a previous results file; return True on regression."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    
+    def key(r):
+        return (r['suite'], r['input_words'], r['concurrency'])
+    
+    previous = {key(r): r['stats'] for r in baseline['results']}
+    regressed = False
+    print(f"\nComparison against {baseline_path} (commit {baseline['metadata'].get('commit')}):")
+    if baseline['metadata'].get('model') != model:
+        print(f"  WARNING: model setup differs: {baseline['metadata'].get('model')} -> {model}")
+    for r in results:
+        old = previous.get(key(r))
+        if not old or 'p50_ms' not in old or 'p50_ms' not in r['stats']:
+            continue
+        ratio = r['stats']['p50_ms'] / old['p50_ms']
+        flag = ''
+        if ratio > 1 + tolerance:
+            flag = '  REGRESSION'
+            regressed = True
+        print(f"  {r['suite']:<18} words={str(r['input_words']):<5} c={r['concurrency']:<3} "
+              f"p50 {old['p50_ms']:.2f} -> {r['stats']['p50_ms']:.2f} ms ({ratio:.2f}x){flag}")
+    return regressed
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark the inference and API hot paths.')
+    parser.add_argument('--suites', nargs='+', choices=SUITES, default=SUITES,
+                        help='Benchmarks to run')
+    parser.add_argument('--sizes', nargs='+', type=int, default=[32, 128, 512],
+                        help='Input sizes in words (page rows for the history and encode suites)')
+    parser.add_argument('--concurrency', nargs='+', type=int, default=[1, 4],
+                        help='Concurrency levels (worker threads)')
+    parser.add_argument('--iterations', type=int, default=20,
+                        help='Timed calls per benchmark')
+    parser.add_argument('--warmup', type=int, default=2,
+                        help='Untimed warm-up calls per worker')
+    parser.add_argument('--threads', type=int, default=None,
+                        help='torch intra-op threads (default: torch default)')
+    parser.add_argument('--seed', type=int, default=42,
+                        help='Seed for synthetic inputs and torch')
+    parser.add_argument('--output', default=f'benchmark_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json',
+                        help='Where to write the JSON results')
+    parser.add_argument('--baseline', default=None,
+                        help='Previous results file to compare p50 latencies against')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='Allowed p50 slowdown before flagging a regression')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    
+    # Point the app at a throwaway database before app.routes.api creates its engine
+    db_dir = tempfile.mkdtemp(prefix='justice_ai_bench_')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(db_dir, 'bench.db')}"
+    
+    import torch
+    torch.manual_seed(args.seed)
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    
+    results = []
+    for suite, size, concurrency, make_op, *extra in itertools.chain(build_cases(args),
+                                                                     build_encoding_cases(args)):
+        print(f"Running {suite} words={size} concurrency={concurrency}...")
+        stats = run_timed(make_op, args.iterations, concurrency, args.warmup)
+        results.append({
+            'suite': suite,
+            'input_words': size,
+            'concurrency': concurrency,
+            'stats': stats,
+            **(extra[0] if extra else {})
+        })
+    
+    model = model_metadata(args)
+    report = {
+        'metadata': {
+            'commit': git_commit(),
+            'timestamp': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'torch': torch.__version__,
+            'torch_threads': torch.get_num_threads(),
+            'iterations': args.iterations,
+            'warmup': args.warmup,
+            'seed': args.seed,
+            'model': model
+        },
+        'results': results
+    }
+    
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+    
+    if args.baseline and compare(results, model, args.baseline, args.tolerance):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
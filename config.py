@@ -12,11 +12,42 @@ class Config:
     MODEL_PATH = os.getenv('MODEL_PATH', 'models/legal_bert_model')
     MAX_SEQUENCE_LENGTH = 512
     
+    # Model registry settings: trained models are registered as versioned
+    # directories and hot-swapped in via the admin endpoint or the watcher
+    MODEL_REGISTRY_PATH = os.getenv('MODEL_REGISTRY_PATH', 'models/registry')
+    MODEL_WATCH_INTERVAL = float(os.getenv('MODEL_WATCH_INTERVAL', '0'))  # seconds, 0 disables
+    ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')  # admin endpoints return 403 until this is set
+    
+    # Cascade settings: a distilled student answers first and escalates to the
+    # full model when its confidence is below the threshold
+    STUDENT_MODEL_PATH = os.getenv('STUDENT_MODEL_PATH', 'models/legal_bert_student')
+    CASCADE_THRESHOLD = float(os.getenv('CASCADE_THRESHOLD', '0.9'))
+    STUDENT_NUM_LAYERS = int(os.getenv('STUDENT_NUM_LAYERS', '4'))
+    
+    # Early-exit settings: classifier heads on intermediate encoder layers let
+    # confident requests skip the remaining layers
+    EARLY_EXIT_HEADS_PATH = os.getenv('EARLY_EXIT_HEADS_PATH', 'models/legal_bert_exit_heads.pt')
+    EARLY_EXIT_THRESHOLD = float(os.getenv('EARLY_EXIT_THRESHOLD', '0.9'))
+    EARLY_EXIT_LAYERS = os.getenv('EARLY_EXIT_LAYERS', '2,4,6,8,10')
+    
+    # Profiling settings: when enabled, requests sent with an X-Profile header
+    # and the matching PROFILING_TOKEN are profiled and the results written to
+    # PROFILE_DIR
+    PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+    PROFILING_TOKEN = os.getenv('PROFILING_TOKEN')
+    
     # API settings
     API_TITLE = 'JusticeAI API'
     API_VERSION = 'v1'
     OPENAPI_VERSION = '3.0.2'
     
+    # Response encoding settings: bodies at least COMPRESSION_MIN_SIZE bytes are
+    # gzip/brotli compressed when the client sends a matching Accept-Encoding
+    COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', '1024'))
+    COMPRESSION_LEVEL = int(os.getenv('COMPRESSION_LEVEL', '6'))
+    HISTORY_MAX_LIMIT = int(os.getenv('HISTORY_MAX_LIMIT', '1000'))
+    
     # File upload settings
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     ALLOWED_EXTENSIONS = {'txt', 'pdf', 'doc', 'docx'} 
\ No newline at end of file
@@ -0,0 +1,251 @@
+import argparse
+import glob
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from benchmark import summarize, synthetic_text, git_commit
+
+def load_payloads(path, limit=None):
+    """Load case payloads from a DataService.export_model_data JSON dump.
+    
+    `path` may be a file or a directory, in which case the newest
+    `cases_*.json` dump inside it is used.
+    """
+    if os.path.isdir(path):
+        dumps = sorted(glob.glob(os.path.join(path, 'cases_*.json')))
+        if not dumps:
+            raise FileNotFoundError(f"No cases_*.json dumps found in {path}")
+        path = dumps[-1]
+    
+    with open(path) as f:
+        cases = json.load(f)
+    
+    fields = ('title', 'description', 'plaintiff', 'defendant', 'case_type')
+    payloads = [
+        {field: case[field] for field in fields if case.get(field) is not None}
+        for case in cases if case.get('description')
+    ]
+    if not payloads:
+        raise ValueError(f"No cases with a description in {path}")
+    return payloads[:limit] if limit else payloads
+
+def synthetic_payloads(count, sizes, seed):
+    return [
+        {
+            'title': f'Load Test Case {i}',
+            'description': synthetic_text(sizes[i % len(sizes)], seed + i),
+            'case_type': 'Load Test'
+        }
+        for i in range(count)
+    ]
+
+class Target:
+    """Sends /api/predict requests to a live server or an in-process app."""
+    
+    def __init__(self, url=None):
+        self.url = url.rstrip('/') if url else None
+        self._local = threading.local()
+        if self.url:
+            import requests
+            self._requests = requests
+        else:
+            from run import create_app
+            self.app = create_app()
+            self.app.config['TESTING'] = True
+    
+    def _client(self):
+        # Test clients and requests sessions are not shared between threads
+        if not hasattr(self._local, 'client'):
+            self._local.client = self._requests.Session() if self.url else self.app.test_client()
+        return self._local.client
+    
+    def post(self, path, payload):
+        client = self._client()
+        if self.url:
+            return client.post(f'{self.url}{path}', json=payload, timeout=60).status_code
+        return client.post(f'/api{path}', json=payload).status_code
+    
+    def get_json(self, path):
+        client = self._client()
+        if self.url:
+            return client.get(f'{self.url}{path}', timeout=10).json()
+        return client.get(f'/api{path}').get_json()
+
+def stage_delta(before, after):
+    """Per-stage average latency over the window between two /api/stats samples."""
+    delta = {}
+    for name, stats in after.items():
+        prev = before.get(name, {'count': 0, 'total_ms': 0.0})
+        count = stats['count'] - prev['count']
+        if count > 0:
+            delta[name] = {
+                'count': count,
+                'avg_ms': (stats['total_ms'] - prev['total_ms']) / count
+            }
+    return delta
+
+def run_rate(target, payloads, rate, duration, max_inflight, seed, sample_stages):
+    """Drive `rate` requests/s with Poisson arrivals for `duration` seconds.
+    
+    Arrivals are open-loop: each request is scheduled independently of earlier
+    completions, and latency is measured from its scheduled send time so that
+    queueing inside the generator counts against the server (no coordinated
+    omission).
+    """
+    rng = random.Random(seed)
+    lock = threading.Lock()
+    latencies, errors = [], 0
+    sequence = [0]
+    
+    def send(scheduled):
+        nonlocal errors
+        with lock:
+            sequence[0] += 1
+            n = sequence[0]
+        payload = dict(payloads[n % len(payloads)])
+        payload['case_number'] = f'LOAD-{seed}-{n}'
+        try:
+            ok = target.post('/predict', payload) == 200
+        except Exception:
+            ok = False
+        latency = time.perf_counter() - scheduled
+        with lock:
+            latencies.append(latency)
+            if not ok:
+                errors += 1
+    
+    stages_before = target.get_json('/stats').get('stages', {}) if sample_stages else None
+    
+    start = time.perf_counter()
+    next_arrival = start
+    offered = 0
+    with ThreadPoolExecutor(max_workers=max_inflight) as executor:
+        while True:
+            next_arrival += rng.expovariate(rate)
+            if next_arrival - start >= duration:
+                break
+            delay = next_arrival - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(send, next_arrival)
+            offered += 1
+    wall_time = time.perf_counter() - start
+    
+    stats = summarize(latencies, errors, wall_time)
+    stats['offered_rps'] = rate
+    stats['sent'] = offered
+    stats['error_rate'] = errors / offered if offered else 0.0
+    
+    result = {'rate': rate, 'stats': stats}
+    if sample_stages:
+        stages_after = target.get_json('/stats').get('stages', {})
+        result['server_stages'] = stage_delta(stages_before, stages_after)
+    return result
+
+def meets_slo(stats, p99_target_ms, max_error_rate):
+    return (stats.get('count', 0) > 0
+            and stats['p99_ms'] <= p99_target_ms
+            and stats['error_rate'] <= max_error_rate)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Open-loop load generator for /api/predict.')
+    parser.add_argument('--url', default=None,
+                        help='Base API URL of a running server (e.g. http://localhost:5000/api); '
+                             'defaults to an in-process app')
+    parser.add_argument('--payloads', default=None,
+                        help='Case JSON dump (or data/raw directory) from DataService.export_model_data')
+    parser.add_argument('--limit', type=int, default=None,
+                        help='Use at most this many recorded payloads')
+    parser.add_argument('--sizes', nargs='+', type=int, default=[64, 256],
+                        help='Synthetic description sizes in words when no payloads are given')
+    parser.add_argument('--rates', nargs='+', type=float, default=[1, 2, 4, 8, 16],
+                        help='Arrival rates (requests/s) to step through, in increasing order')
+    parser.add_argument('--duration', type=float, default=30,
+                        help='Seconds to hold each rate')
+    parser.add_argument('--p99-target', type=float, default=1000,
+                        help='p99 latency SLO in milliseconds')
+    parser.add_argument('--max-error-rate', type=float, default=0.01,
+                        help='Highest error rate that still meets the SLO')
+    parser.add_argument('--max-inflight', type=int, default=256,
+                        help='Maximum concurrent in-flight requests')
+    parser.add_argument('--stop-on-saturation', action='store_true',
+                        help='Stop stepping up the rate once the SLO is missed')
+    parser.add_argument('--sample-stages', action='store_true',
+                        help='Sample per-stage server timings from /api/stats for each rate')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default=f'loadgen_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json',
+                        help='Where to write the JSON report')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    
+    if args.payloads:
+        payloads = load_payloads(args.payloads, args.limit)
+    else:
+        payloads = synthetic_payloads(100, args.sizes, args.seed)
+    
+    if not args.url:
+        # Keep load-test cases out of the real database
+        db_dir = tempfile.mkdtemp(prefix='justice_ai_load_')
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(db_dir, 'load.db')}"
+    
+    target = Target(args.url)
+    
+    curve = []
+    saturation_rate = None
+    max_sustainable = None
+    for i, rate in enumerate(sorted(args.rates)):
+        print(f"Offering {rate} req/s for {args.duration}s...")
+        result = run_rate(target, payloads, rate, args.duration, args.max_inflight,
+                          args.seed + i, args.sample_stages)
+        stats = result['stats']
+        result['meets_slo'] = meets_slo(stats, args.p99_target, args.max_error_rate)
+        curve.append(result)
+        
+        if stats.get('count'):
+            print(f"  achieved {stats['throughput_rps']:.2f} req/s, p50 {stats['p50_ms']:.1f} ms, "
+                  f"p99 {stats['p99_ms']:.1f} ms, errors {stats['error_rate']:.2%}")
+        
+        # A rate that passes above the first failure is noise, not sustainable capacity
+        if saturation_rate is None:
+            if result['meets_slo']:
+                max_sustainable = rate
+            else:
+                saturation_rate = rate
+                if args.stop_on_saturation:
+                    break
+    
+    report = {
+        'metadata': {
+            'commit': git_commit(),
+            'timestamp': datetime.now().isoformat(),
+            'target': args.url or 'in-process',
+            'payload_source': args.payloads or 'synthetic',
+            'payload_count': len(payloads),
+            'duration_s': args.duration,
+            'p99_target_ms': args.p99_target,
+            'max_error_rate': args.max_error_rate,
+            'seed': args.seed
+        },
+        'curve': curve,
+        'max_sustainable_rps': max_sustainable,
+        'saturation_rps': saturation_rate
+    }
+    
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    
+    print(f"Max sustainable rate at p99 <= {args.p99_target} ms: {max_sustainable} req/s")
+    print(f"Saturation point: {saturation_rate} req/s")
+    print(f"Report written to {args.output}")
+
+if __name__ == '__main__':
+    main()
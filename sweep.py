@@ -0,0 +1,288 @@
+import argparse
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import torch
+from datasets import Dataset, load_from_disk
+from transformers import AutoModelForSequenceClassification, AutoTokenizer, Trainer, TrainerCallback
+
+from app.services.data_service import DataService
+from app.services.model_registry import ModelRegistry
+from train_model import BASE_MODEL, build_training_args, compute_metrics, load_case_data, tokenize_dataset, logger
+
+DEFAULT_SPACE = {
+    'learning_rate': [2e-5, 3e-5, 5e-5],
+    'batch_size': [4, 8],
+    'max_length': [128, 256],
+    'num_train_epochs': [2, 3]
+}
+
+class MedianPruningCallback(TrainerCallback):
+    """Stop a trial whose metric falls below the median of other trials at the same epoch.
+    
+    Intermediate metrics are shared between worker processes through a
+    Manager dict keyed by `<trial_id>:<eval_index>`. A trial's final evaluation
+    is never pruned, since stopping there saves no training and would only
+    discard the finished model.
+    """
+    
+    def __init__(self, trial_id, shared_metrics, metric, min_trials=2, warmup_evals=1):
+        self.trial_id = trial_id
+        self.shared_metrics = shared_metrics
+        self.metric = f'eval_{metric}'
+        self.min_trials = min_trials
+        self.warmup_evals = warmup_evals
+        self.history = []
+        self.last_metrics = None
+        self.pruned = False
+    
+    def on_evaluate(self, args, state, control, metrics=None, **kwargs):
+        value = (metrics or {}).get(self.metric)
+        if value is None:
+            return
+        eval_index = len(self.history)
+        self.history.append({'epoch': state.epoch, 'step': state.global_step, self.metric: value})
+        self.last_metrics = metrics
+        self.shared_metrics[f'{self.trial_id}:{eval_index}'] = value
+        
+        if eval_index < self.warmup_evals or state.global_step >= state.max_steps:
+            return
+        others = [
+            v for k, v in self.shared_metrics.items()
+            if k.endswith(f':{eval_index}') and not k.startswith(f'{self.trial_id}:')
+        ]
+        if len(others) >= self.min_trials and value < statistics.median(others):
+            self.pruned = True
+            control.should_training_stop = True
+
+def build_search_space(space, max_trials, seed):
+    """Expand a {param: [values]} space into a grid, randomly subsampled to `max_trials`."""
+    keys = sorted(space)
+    trials = [dict(zip(keys, values)) for values in itertools.product(*(space[k] for k in keys))]
+    if max_trials and len(trials) > max_trials:
+        trials = random.Random(seed).sample(trials, max_trials)
+    return trials
+
+def cache_tokenized_datasets(train_df, val_df, max_lengths, cache_dir):
+    """Tokenize once per max_length and save to disk so every trial reuses the result.
+    
+    The cache is keyed by a fingerprint of the training data, so later sweeps
+    over the same cases skip tokenization entirely.
+    """
+    fingerprint = hashlib.sha256(
+        (train_df['processed_text'] + '|' + train_df['label'].astype(str)).str.cat().encode('utf-8')
+        + (val_df['processed_text'] + '|' + val_df['label'].astype(str)).str.cat().encode('utf-8')
+    ).hexdigest()[:16]
+    
+    tokenizer = AutoTokenizer.from_pretrained(BASE_MODEL)
+    paths = {}
+    for max_length in max_lengths:
+        path = os.path.join(cache_dir, fingerprint, f'len{max_length}')
+        if not os.path.isdir(path):
+            logger.info(f"Tokenizing datasets with max_length={max_length}...")
+            tokenize_dataset(tokenizer, Dataset.from_pandas(train_df), max_length).save_to_disk(
+                os.path.join(path, 'train'))
+            tokenize_dataset(tokenizer, Dataset.from_pandas(val_df), max_length).save_to_disk(
+                os.path.join(path, 'val'))
+        paths[max_length] = path
+    return paths
+
+def init_worker(core_queue, threads_per_trial):
+    """Pin each worker process to its own slice of cores and size torch's thread pool to match."""
+    cores = core_queue.get()
+    if cores and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+    torch.set_num_threads(threads_per_trial)
+    torch.set_num_interop_threads(1)
+
+def run_trial(trial_id, params, dataset_path, output_dir, shared_metrics, metric, min_trials):
+    """Train one configuration and return its result record."""
+    start = time.perf_counter()
+    trial_dir = os.path.join(output_dir, f'trial_{trial_id:03d}')
+    result = {'trial_id': trial_id, 'params': params, 'model_dir': None}
+    
+    try:
+        train_dataset = load_from_disk(os.path.join(dataset_path, 'train'))
+        val_dataset = load_from_disk(os.path.join(dataset_path, 'val'))
+        
+        model = AutoModelForSequenceClassification.from_pretrained(
+            BASE_MODEL,
+            num_labels=3,
+            torch_dtype=torch.float32
+        )
+        training_args = build_training_args(
+            os.path.join(trial_dir, 'checkpoints'),
+            learning_rate=params['learning_rate'],
+            per_device_train_batch_size=params['batch_size'],
+            per_device_eval_batch_size=params['batch_size'],
+            gradient_accumulation_steps=1,
+            num_train_epochs=params['num_train_epochs'],
+            evaluation_strategy='epoch',
+            save_strategy='epoch',
+            save_total_limit=1,
+            metric_for_best_model=metric,
+            logging_dir=os.path.join(trial_dir, 'logs'),
+            report_to=[]
+        )
+        pruning = MedianPruningCallback(trial_id, shared_metrics, metric, min_trials=min_trials)
+        
+        trainer = Trainer(
+            model=model,
+            args=training_args,
+            train_dataset=train_dataset,
+            eval_dataset=val_dataset,
+            compute_metrics=compute_metrics,
+            callbacks=[pruning]
+        )
+        trainer.train()
+        # A pruned trial's last epoch evaluation is its result; only finished trials
+        # are re-evaluated, on the best checkpoint loaded at the end of training
+        metrics = pruning.last_metrics if pruning.pruned else trainer.evaluate()
+        
+        result['status'] = 'pruned' if pruning.pruned else 'completed'
+        result['metrics'] = metrics
+        result['history'] = pruning.history
+        if not pruning.pruned:
+            model_dir = os.path.join(trial_dir, 'model')
+            trainer.save_model(model_dir)
+            AutoTokenizer.from_pretrained(BASE_MODEL).save_pretrained(model_dir)
+            result['model_dir'] = model_dir
+        shutil.rmtree(os.path.join(trial_dir, 'checkpoints'), ignore_errors=True)
+    
+    except Exception as e:
+        result['status'] = 'failed'
+        result['error'] = str(e)
+    
+    result['duration_s'] = time.perf_counter() - start
+    return result
+
+def promote(best, model_path):
+    """Copy the best trial's model to MODEL_PATH and register it as the serving version."""
+    staging = f"{model_path.rstrip(os.sep)}.staging"
+    shutil.rmtree(staging, ignore_errors=True)
+    shutil.copytree(best['model_dir'], staging)
+    if os.path.isdir(model_path):
+        shutil.rmtree(model_path)
+    os.rename(staging, model_path)
+    
+    registry = ModelRegistry(os.getenv('MODEL_REGISTRY_PATH', 'models/registry'))
+    return registry.register(model_path)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Parallel hyperparameter sweep for the verdict model.')
+    parser.add_argument('--space', default=None,
+                        help='JSON file mapping learning_rate, batch_size, max_length and '
+                             'num_train_epochs to lists of values')
+    parser.add_argument('--max-trials', type=int, default=None,
+                        help='Randomly sample at most this many configurations from the grid')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Parallel trials (default: cores // threads-per-trial)')
+    parser.add_argument('--threads-per-trial', type=int, default=2,
+                        help='CPU cores pinned to each trial')
+    parser.add_argument('--metric', default='f1', choices=['accuracy', 'f1', 'precision', 'recall'],
+                        help='compute_metrics value used for pruning and picking the best trial')
+    parser.add_argument('--min-trials-to-prune', type=int, default=2,
+                        help='Other trials needed at an epoch before pruning against their median')
+    parser.add_argument('--output-dir', default=f'sweeps/{datetime.now().strftime("%Y%m%d_%H%M%S")}',
+                        help='Where trial models and results are written')
+    parser.add_argument('--cache-dir', default='data/processed/tokenized',
+                        help='Tokenized dataset cache shared across trials and sweeps')
+    parser.add_argument('--promote', action='store_true',
+                        help='Copy the best model to MODEL_PATH and register it as the serving version')
+    parser.add_argument('--seed', type=int, default=42)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    
+    space = DEFAULT_SPACE
+    if args.space:
+        with open(args.space) as f:
+            space = json.load(f)
+    trials = build_search_space(space, args.max_trials, args.seed)
+    
+    case_data = load_case_data()
+    if not case_data:
+        logger.error("No case data found in database")
+        return
+    
+    data_service = DataService()
+    train_df, val_df = data_service.prepare_training_data(case_data)
+    dataset_paths = cache_tokenized_datasets(
+        train_df, val_df, sorted({t['max_length'] for t in trials}), args.cache_dir
+    )
+    
+    # Split the available cores into one fixed slice per worker
+    cores = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(os.cpu_count()))
+    threads = max(1, min(args.threads_per_trial, len(cores)))
+    workers = args.workers or max(1, len(cores) // threads)
+    workers = min(workers, len(trials))
+    
+    os.makedirs(args.output_dir, exist_ok=True)
+    results_path = os.path.join(args.output_dir, 'results.jsonl')
+    logger.info(f"Running {len(trials)} trials on {workers} workers x {threads} threads...")
+    
+    context = multiprocessing.get_context('spawn')
+    manager = context.Manager()
+    shared_metrics = manager.dict()
+    core_queue = context.Queue()
+    for i in range(workers):
+        core_queue.put(cores[i * threads:(i + 1) * threads] if (i + 1) * threads <= len(cores) else None)
+    
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=init_worker, initargs=(core_queue, threads)) as executor:
+        futures = [
+            executor.submit(run_trial, trial_id, params, dataset_paths[params['max_length']],
+                            args.output_dir, shared_metrics, args.metric, args.min_trials_to_prune)
+            for trial_id, params in enumerate(trials)
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            with open(results_path, 'a') as f:
+                f.write(json.dumps(result) + '\n')
+            score = result.get('metrics', {}).get(f'eval_{args.metric}')
+            logger.info(f"Trial {result['trial_id']} {result['status']}: {result['params']} "
+                        f"{args.metric}={score}")
+    
+    completed = [r for r in results if r['status'] == 'completed' and r['model_dir']]
+    best = max(completed, key=lambda r: r['metrics'][f'eval_{args.metric}'], default=None)
+    
+    summary = {
+        'space': space,
+        'metric': args.metric,
+        'trials': len(trials),
+        'completed': len(completed),
+        'pruned': sum(r['status'] == 'pruned' for r in results),
+        'failed': sum(r['status'] == 'failed' for r in results),
+        'best': best,
+        'promoted_version': None
+    }
+    
+    if best is None:
+        logger.error("No trial completed successfully")
+    else:
+        logger.info(f"Best trial {best['trial_id']}: {best['params']} "
+                    f"{args.metric}={best['metrics'][f'eval_{args.metric}']:.4f}")
+        if args.promote:
+            model_path = os.getenv('MODEL_PATH', 'models/legal_bert_model')
+            summary['promoted_version'] = promote(best, model_path)
+            data_service.save_watermark(case_data, model_version=summary['promoted_version'])
+            logger.info(f"Promoted trial {best['trial_id']} to {model_path} "
+                        f"as version {summary['promoted_version']}")
+    
+    with open(os.path.join(args.output_dir, 'summary.json'), 'w') as f:
+        json.dump(summary, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+import pytest
+
+pytest.importorskip('pandas')
+pytest.importorskip('sklearn')
+
+from app.services.data_service import DataService
+
+
+def make_case(case_id, verdict='Guilty'):
+    return {'id': case_id, 'description': f'Case {case_id} description', 'verdict': verdict}
+
+
+@pytest.fixture
+def data_service(tmp_path):
+    return DataService(str(tmp_path))
+
+
+def test_watermark_round_trip(data_service):
+    assert data_service.load_watermark() is None
+    
+    data_service.save_watermark([make_case(1), make_case(3, 'Not Guilty')], model_version='v1')
+    watermark = data_service.load_watermark()
+    
+    assert watermark['model_version'] == 'v1'
+    assert watermark['max_case_id'] == 3
+    assert watermark['labels'] == {'1': 'Guilty', '3': 'Not Guilty'}
+
+
+def test_new_cases_are_split_from_old(data_service):
+    old = [make_case(i) for i in range(1, 6)]
+    data_service.save_watermark(old)
+    added = [make_case(6), make_case(7)]
+    
+    new_cases, replay_cases = data_service.select_incremental_cases(old + added, data_service.load_watermark())
+    
+    assert new_cases == added
+    assert all(case in old for case in replay_cases)
+
+
+def test_relabelled_case_is_new(data_service):
+    cases = [make_case(i) for i in range(1, 6)]
+    data_service.save_watermark(cases)
+    cases[1] = make_case(2, 'Inconclusive')
+    
+    new_cases, _ = data_service.select_incremental_cases(cases, data_service.load_watermark())
+    
+    assert new_cases == [cases[1]]
+
+
+def test_unseen_case_below_max_id_is_new(data_service):
+    data_service.save_watermark([make_case(1), make_case(5)])
+    
+    new_cases, _ = data_service.select_incremental_cases(
+        [make_case(1), make_case(3), make_case(5)], data_service.load_watermark()
+    )
+    
+    assert new_cases == [make_case(3)]
+
+
+@pytest.mark.parametrize('replay_ratio, n_new, n_old, expected', [
+    (0.5, 4, 10, 2),
+    (1.0, 4, 10, 4),
+    (2.0, 4, 5, 5),  # capped by the number of old cases
+    (0.0, 4, 10, 0),
+])
+def test_replay_size(data_service, replay_ratio, n_new, n_old, expected):
+    old = [make_case(i) for i in range(1, n_old + 1)]
+    data_service.save_watermark(old)
+    new = [make_case(n_old + i) for i in range(1, n_new + 1)]
+    
+    _, replay_cases = data_service.select_incremental_cases(
+        old + new, data_service.load_watermark(), replay_ratio=replay_ratio
+    )
+    
+    assert len(replay_cases) == expected
+    assert len({case['id'] for case in replay_cases}) == expected
+
+
+def test_replay_sample_is_deterministic(data_service):
+    old = [make_case(i) for i in range(1, 21)]
+    data_service.save_watermark(old)
+    cases = old + [make_case(21), make_case(22)]
+    watermark = data_service.load_watermark()
+    
+    first = data_service.select_incremental_cases(cases, watermark, seed=7)
+    second = data_service.select_incremental_cases(cases, watermark, seed=7)
+    
+    assert first == second
+
+
+def test_incremental_data_trains_on_every_new_case(data_service):
+    new = [make_case(i) for i in range(10, 14)]
+    replay = [make_case(1, 'Not Guilty'), make_case(2)]
+    
+    train_df, val_df = data_service.prepare_incremental_data(new, replay)
+    
+    assert set(train_df['id']) == {10, 11, 12, 13, 1, 2}
+    assert set(val_df['id']) == {1, 2}
+
+
+def test_incremental_data_without_replay(data_service):
+    train_df, val_df = data_service.prepare_incremental_data([make_case(1)], [])
+    
+    assert list(train_df['id']) == [1]
+    assert list(val_df['id']) == [1]
+
+
+@pytest.mark.parametrize('n_cases', [2, 3, 4])
+def test_small_training_sets_split(data_service, n_cases):
+    verdicts = ['Guilty', 'Not Guilty', 'Inconclusive']
+    cases = [make_case(i, verdicts[i % 3]) for i in range(n_cases)]
+    
+    train_df, val_df = data_service.prepare_training_data(cases)
+    
+    assert len(train_df) > 0 and len(val_df) > 0
+    assert len(train_df) + len(val_df) == n_cases
+
+
+def test_single_case_cannot_be_split(data_service):
+    with pytest.raises(ValueError):
+        data_service.prepare_training_data([make_case(1)])
@@ -0,0 +1,200 @@
+import pytest
+
+torch = pytest.importorskip('torch')
+pytest.importorskip('transformers')
+
+from transformers import AutoTokenizer, BertConfig, BertForSequenceClassification, BertTokenizerFast
+
+from app.services.ml_service import ExitHead, MLService
+from app.services.model_registry import ModelRegistry
+
+VOCAB = ['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]',
+         'the', 'plaintiff', 'defendant', 'alleges', 'breach', 'of', 'contract', 'court', 'evidence']
+TEXTS = [
+    'The plaintiff alleges breach of contract.',
+    'The defendant and the court.',
+    'Evidence of the breach.'
+]
+
+
+def save_tiny_bert(path, num_layers, seed=0):
+    """Save a small randomly initialised BERT classifier, so no checkpoint is downloaded."""
+    torch.manual_seed(seed)
+    config = BertConfig(
+        vocab_size=len(VOCAB),
+        hidden_size=16,
+        num_hidden_layers=num_layers,
+        num_attention_heads=2,
+        intermediate_size=32,
+        max_position_embeddings=256,
+        num_labels=3
+    )
+    BertForSequenceClassification(config).save_pretrained(str(path))
+    return str(path)
+
+
+@pytest.fixture
+def tiny_tokenizer(tmp_path, monkeypatch):
+    vocab_file = tmp_path / 'vocab.txt'
+    vocab_file.write_text('\n'.join(VOCAB))
+    tokenizer = BertTokenizerFast(vocab_file=str(vocab_file))
+    # MLService always loads the legal-bert tokenizer; serve the tiny one instead
+    monkeypatch.setattr(AutoTokenizer, 'from_pretrained', lambda *args, **kwargs: tokenizer)
+    return tokenizer
+
+
+@pytest.fixture
+def model_path(tmp_path, tiny_tokenizer):
+    return save_tiny_bert(tmp_path / 'model', num_layers=4)
+
+
+def save_exit_heads(path, heads, hidden_size=16):
+    """Save heads in the format written by ``train_model.py --early-exit``."""
+    torch.save({
+        'hidden_size': hidden_size,
+        'num_labels': 3,
+        'heads': {layer: head.state_dict() for layer, head in heads.items()}
+    }, str(path))
+    return str(path)
+
+
+def confident_head(label, hidden_size=16):
+    """An exit head that always predicts `label` with near-certain confidence."""
+    head = ExitHead(hidden_size)
+    with torch.no_grad():
+        head.classifier.weight.zero_()
+        head.classifier.bias.zero_()
+        head.classifier.bias[label] = 20.0
+    return head
+
+
+@pytest.fixture
+def student_path(tmp_path):
+    return save_tiny_bert(tmp_path / 'student', num_layers=1, seed=1)
+
+
+@pytest.mark.parametrize('threshold, escalation_rate', [(0.0, 0.0), (1.01, 1.0)])
+def test_cascade_threshold_gate(model_path, student_path, threshold, escalation_rate):
+    service = MLService(model_path, student_path=student_path, cascade_threshold=threshold)
+    
+    versions = [service.predict_with_version(text)[2] for text in TEXTS]
+    stats = service.get_cascade_stats()
+    
+    assert stats['enabled']
+    assert stats['requests'] == len(TEXTS)
+    assert stats['escalation_rate'] == escalation_rate
+    if escalation_rate:
+        assert versions == ['local'] * len(TEXTS)
+        assert stats['avg_full_latency_ms'] is not None
+    else:
+        assert versions == ['local+student'] * len(TEXTS)
+        assert stats['avg_full_latency_ms'] is None
+
+
+def test_cascade_disabled_without_student(model_path, tmp_path):
+    service = MLService(model_path, student_path=str(tmp_path / 'missing'))
+    
+    for text in TEXTS:
+        service.predict(text)
+    stats = service.get_cascade_stats()
+    
+    assert not stats['enabled']
+    assert stats['escalations'] == 0
+    assert stats['avg_student_latency_ms'] is None
+
+
+def test_cascade_savings_estimate(model_path, student_path):
+    service = MLService(model_path, student_path=student_path)
+    
+    service._record_cascade(service._active, 0.01, None)
+    service._record_cascade(service._active, 0.01, 0.1, escalated=True)
+    stats = service.get_cascade_stats()
+    
+    # Baseline: 2 requests x 100 ms on the full model; actual: 20 ms student + 100 ms full
+    assert stats['escalation_rate'] == 0.5
+    assert stats['avg_student_latency_ms'] == pytest.approx(10.0)
+    assert stats['avg_full_latency_ms'] == pytest.approx(100.0)
+    assert stats['estimated_latency_saved_ms'] == pytest.approx(80.0)
+    assert stats['estimated_latency_saved_pct'] == pytest.approx(40.0)
+
+
+def test_early_exit_without_exit_matches_full_model(model_path, tmp_path):
+    torch.manual_seed(2)
+    heads = {layer: ExitHead(16) for layer in (1, 2, 3)}
+    heads_path = save_exit_heads(tmp_path / 'exit_heads.pt', heads)
+    # No head can reach a threshold above 1, so every request runs all layers
+    service = MLService(model_path, exit_heads_path=heads_path, exit_threshold=1.01)
+    
+    for text in TEXTS:
+        inputs = service.preprocess_text(text)
+        with torch.no_grad():
+            expected = torch.softmax(service.model(**inputs).logits, dim=1)
+        verdict, confidence = service._classify_early_exit(service._active, inputs)
+        
+        assert verdict == service._classify(service.model, inputs)[0]
+        assert confidence == pytest.approx(expected.max().item(), abs=1e-5)
+    
+    stats = service.get_exit_stats()
+    assert stats['head_layers'] == [1, 2, 3]
+    assert stats['exits_per_layer'] == {4: len(TEXTS)}
+    assert stats['avg_layers_skipped'] == 0
+
+
+def test_confident_head_exits_early(model_path, tmp_path):
+    heads_path = save_exit_heads(tmp_path / 'exit_heads.pt', {2: confident_head(1), 3: confident_head(2)})
+    service = MLService(model_path, exit_heads_path=heads_path, exit_threshold=0.9)
+    
+    verdict, confidence, version = service.predict_with_version(TEXTS[0])
+    stats = service.get_exit_stats()
+    
+    assert (verdict, version) == ('Not Guilty', 'local')
+    assert confidence > 0.99
+    assert stats['enabled']
+    assert stats['exits_per_layer'] == {2: 1}
+    assert stats['avg_layers_skipped'] == 2
+
+
+def test_head_on_final_layer_is_skipped(model_path, tmp_path):
+    text = TEXTS[0]
+    plain = MLService(model_path)
+    expected = plain._classify(plain.model, plain.preprocess_text(text))
+    # A confident head that disagrees with the model's own classifier
+    label = (['Guilty', 'Not Guilty', 'Inconclusive'].index(expected[0]) + 1) % 3
+    heads_path = save_exit_heads(tmp_path / 'exit_heads.pt', {4: confident_head(label)})
+    service = MLService(model_path, exit_heads_path=heads_path, exit_threshold=0.0)
+    
+    verdict, confidence = service.predict(text)
+    
+    assert verdict == expected[0]
+    assert confidence == pytest.approx(expected[1], abs=1e-5)
+    assert service.get_exit_stats()['exits_per_layer'] == {4: 1}
+
+
+def test_swap_resets_exit_and_cascade_stats(model_path, student_path, tmp_path):
+    heads_path = save_exit_heads(tmp_path / 'exit_heads.pt', {2: confident_head(0)})
+    registry = ModelRegistry(str(tmp_path / 'registry'))
+    service = MLService(model_path, student_path=student_path, cascade_threshold=1.01,
+                        exit_heads_path=heads_path, registry=registry)
+    old_version = service._active
+    for text in TEXTS:
+        service.predict(text)
+    assert service.get_exit_stats()['requests'] == len(TEXTS)
+    
+    # The new version has neither exit heads nor a student
+    version = registry.register(model_path, promote=False)
+    assert service.swap_to(version, background=False)
+    
+    exit_stats = service.get_exit_stats()
+    cascade_stats = service.get_cascade_stats()
+    assert service.model_version == version
+    assert registry.current_version() == version
+    assert not exit_stats['enabled']
+    assert exit_stats['requests'] == 0
+    assert not cascade_stats['enabled']
+    assert cascade_stats['requests'] == 0
+    
+    # Requests still finishing on the old version are not counted
+    service._record_exit(old_version, 2)
+    service._record_cascade(old_version, 0.01, None)
+    assert service.get_exit_stats()['exits_per_layer'] == {}
+    assert service.get_cascade_stats()['requests'] == 0
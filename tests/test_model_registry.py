@@ -0,0 +1,82 @@
+import os
+import threading
+
+import pytest
+
+from app.services.model_registry import ModelRegistry
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return ModelRegistry(str(tmp_path / 'registry'))
+
+
+@pytest.fixture
+def model_dir(tmp_path):
+    path = tmp_path / 'model'
+    path.mkdir()
+    (path / 'config.json').write_text('{}')
+    return str(path)
+
+
+def test_empty_registry(registry):
+    assert registry.list_versions() == []
+    assert registry.current_version() is None
+
+
+def test_register_promotes_by_default(registry, model_dir):
+    version = registry.register(model_dir)
+    
+    assert registry.list_versions() == [version]
+    assert registry.current_version() == version
+    assert os.path.isfile(os.path.join(registry.version_path(version), 'config.json'))
+    assert not any(name.startswith('.staging') for name in os.listdir(registry.root))
+
+
+def test_register_without_promoting(registry, model_dir):
+    first = registry.register(model_dir)
+    second = registry.register(model_dir, promote=False)
+    
+    assert second != first
+    assert registry.list_versions() == [first, second]
+    assert registry.current_version() == first
+
+
+def test_set_current(registry, model_dir):
+    first = registry.register(model_dir)
+    second = registry.register(model_dir, promote=False)
+    
+    registry.set_current(second)
+    assert registry.current_version() == second
+    registry.set_current(first)
+    assert registry.current_version() == first
+
+
+def test_unknown_version_is_rejected(registry, model_dir):
+    version = registry.register(model_dir)
+    
+    with pytest.raises(ValueError):
+        registry.version_path('v19700101_000000')
+    with pytest.raises(ValueError):
+        registry.set_current('v19700101_000000')
+    assert registry.current_version() == version
+
+
+def test_watch_retries_until_change_is_accepted(registry, model_dir):
+    registry.register(model_dir)
+    calls = []
+    accepted = threading.Event()
+    
+    def on_change(version):
+        calls.append(version)
+        # Refuse the first call, as a worker does while another swap is running
+        if len(calls) < 2:
+            return False
+        accepted.set()
+        return True
+    
+    registry.watch(on_change, interval=0.01)
+    version = registry.register(model_dir)
+    
+    assert accepted.wait(5)
+    assert calls[:2] == [version, version]
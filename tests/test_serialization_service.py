@@ -0,0 +1,117 @@
+import gzip
+import json
+
+import pytest
+
+from app.services import serialization_service
+from app.services.serialization_service import (
+    ARROW_MIMETYPE, JSON_MIMETYPE, MSGPACK_MIMETYPE, SerializationService
+)
+
+RECORDS = [
+    {'id': 1, 'verdict': 'Guilty', 'confidence_score': 0.91},
+    {'id': 2, 'verdict': 'Not Guilty', 'confidence_score': 0.64}
+]
+
+
+@pytest.fixture
+def service():
+    return SerializationService(compression_min_size=100, compression_level=6)
+
+
+def best_match(service, accept, tabular=True):
+    """Pick a response format the way the API does."""
+    datastructures = pytest.importorskip('werkzeug.datastructures')
+    http = pytest.importorskip('werkzeug.http')
+    accept_mimetypes = http.parse_accept_header(accept, datastructures.MIMEAccept)
+    return accept_mimetypes.best_match(service.available_formats(tabular=tabular), default=JSON_MIMETYPE)
+
+
+def test_json_is_always_offered_first(service):
+    assert service.available_formats()[0] == JSON_MIMETYPE
+    assert service.available_formats(tabular=True)[0] == JSON_MIMETYPE
+
+
+def test_arrow_only_offered_for_tabular_payloads(service, monkeypatch):
+    monkeypatch.setattr(serialization_service, 'pa', object())
+    
+    assert ARROW_MIMETYPE in service.available_formats(tabular=True)
+    assert ARROW_MIMETYPE not in service.available_formats(tabular=False)
+
+
+def test_missing_libraries_are_not_offered(service, monkeypatch):
+    monkeypatch.setattr(serialization_service, 'msgpack', None)
+    monkeypatch.setattr(serialization_service, 'pa', None)
+    monkeypatch.setattr(serialization_service, 'brotli', None)
+    
+    assert service.available_formats(tabular=True) == [JSON_MIMETYPE]
+    assert service.available_encodings() == ['gzip']
+
+
+@pytest.mark.parametrize('accept, expected', [
+    ('', JSON_MIMETYPE),
+    ('*/*', JSON_MIMETYPE),
+    ('text/html', JSON_MIMETYPE),
+    ('application/msgpack', MSGPACK_MIMETYPE),
+    ('application/vnd.apache.arrow.stream, application/json;q=0.5', ARROW_MIMETYPE),
+])
+def test_negotiation(service, accept, expected):
+    pytest.importorskip('msgpack')
+    pytest.importorskip('pyarrow')
+    
+    assert best_match(service, accept) == expected
+
+
+def test_negotiation_falls_back_to_json_without_arrow(service):
+    assert best_match(service, 'application/vnd.apache.arrow.stream', tabular=False) == JSON_MIMETYPE
+
+
+def test_json_encoding(service):
+    assert json.loads(service.encode(RECORDS)) == RECORDS
+
+
+def test_msgpack_encoding(service):
+    msgpack = pytest.importorskip('msgpack')
+    
+    assert msgpack.unpackb(service.encode(RECORDS, MSGPACK_MIMETYPE)) == RECORDS
+
+
+def test_arrow_encoding(service):
+    pa = pytest.importorskip('pyarrow')
+    
+    table = pa.ipc.open_stream(service.encode(RECORDS, ARROW_MIMETYPE)).read_all()
+    assert table.to_pylist() == RECORDS
+
+
+def test_small_bodies_are_not_compressed(service):
+    data = b'x' * 99
+    
+    assert service.compress(data, 'gzip') == (data, None)
+
+
+def test_gzip_compression(service):
+    data = service.encode(RECORDS * 50)
+    
+    compressed, encoding = service.compress(data, 'gzip')
+    assert encoding == 'gzip'
+    assert gzip.decompress(compressed) == data
+
+
+def test_brotli_compression(service):
+    brotli = pytest.importorskip('brotli')
+    data = service.encode(RECORDS * 50)
+    
+    compressed, encoding = service.compress(data, 'br')
+    assert encoding == 'br'
+    assert brotli.decompress(compressed) == data
+
+
+def test_unknown_encoding_is_ignored(service):
+    data = b'x' * 1000
+    
+    assert service.compress(data, 'deflate') == (data, None)
+
+
+def test_select_fields():
+    assert SerializationService.select_fields(RECORDS, ['id', 'missing']) == [{'id': 1}, {'id': 2}]
+    assert SerializationService.select_fields(RECORDS, []) == RECORDS
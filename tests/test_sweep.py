@@ -0,0 +1,61 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('torch')
+pytest.importorskip('datasets')
+pytest.importorskip('transformers')
+
+from sweep import MedianPruningCallback, build_search_space
+
+
+def evaluate(callback, value, step, max_steps=30):
+    state = SimpleNamespace(epoch=step / 10, global_step=step, max_steps=max_steps)
+    control = SimpleNamespace(should_training_stop=False)
+    callback.on_evaluate(None, state, control, metrics={'eval_f1': value})
+    return control.should_training_stop
+
+
+def test_prunes_below_median_of_other_trials():
+    shared = {'1:1': 0.8, '2:1': 0.6, '3:1': 0.7}
+    callback = MedianPruningCallback(0, shared, 'f1')
+    
+    assert not evaluate(callback, 0.1, 10)  # warmup evaluation
+    assert evaluate(callback, 0.5, 20)
+    assert callback.pruned
+    assert callback.last_metrics == {'eval_f1': 0.5}
+    assert shared['0:1'] == 0.5
+
+
+def test_keeps_trials_at_or_above_median():
+    shared = {'1:1': 0.8, '2:1': 0.6}
+    callback = MedianPruningCallback(0, shared, 'f1')
+    
+    evaluate(callback, 0.1, 10)
+    assert not evaluate(callback, 0.7, 20)
+    assert not callback.pruned
+
+
+def test_needs_min_trials_before_pruning():
+    shared = {'1:1': 0.9}
+    callback = MedianPruningCallback(0, shared, 'f1', min_trials=2)
+    
+    evaluate(callback, 0.1, 10)
+    assert not evaluate(callback, 0.1, 20)
+
+
+def test_never_prunes_final_evaluation():
+    shared = {'1:1': 0.8, '2:1': 0.9}
+    callback = MedianPruningCallback(0, shared, 'f1')
+    
+    evaluate(callback, 0.1, 10, max_steps=20)
+    assert not evaluate(callback, 0.1, 20, max_steps=20)
+    assert not callback.pruned
+
+
+def test_search_space_is_subsampled_deterministically():
+    space = {'learning_rate': [1e-5, 2e-5, 3e-5], 'batch_size': [4, 8]}
+    
+    assert len(build_search_space(space, None, 0)) == 6
+    assert build_search_space(space, 3, 42) == build_search_space(space, 3, 42)
+    assert len(build_search_space(space, 3, 42)) == 3
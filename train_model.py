@@ -1,11 +1,12 @@
 import os
+import argparse
 from app.services.data_service import DataService
-from app.services.ml_service import MLService
-from app.models.case import Case
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from app.services.ml_service import MLService, ExitHead
+from app.services.model_registry import ModelRegistry
 import torch
-from transformers import Trainer, TrainingArguments
+import torch.nn.functional as F
+from torch.utils.data import DataLoader
+from transformers import AutoConfig, AutoModelForSequenceClassification, Trainer, TrainingArguments
 from datasets import Dataset
 import numpy as np
 from sklearn.metrics import accuracy_score, precision_recall_fscore_support
@@ -14,6 +15,8 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+BASE_MODEL = 'nlpaueb/legal-bert-base-uncased'
+
 def compute_metrics(pred):
     """Compute metrics for model evaluation."""
     labels = pred.label_ids
@@ -27,56 +30,72 @@ def compute_metrics(pred):
         'recall': recall
     }
 
-def main():
-    # Initialize services
-    data_service = DataService()
+def load_case_data():
+    """Load every case from the database as a list of dicts."""
+    # Imported here so the training helpers can be used without the database layer
+    from app.models.case import Case
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    
     engine = create_engine(os.getenv('DATABASE_URL', 'sqlite:///justice_ai.db'))
     Session = sessionmaker(bind=engine)
     
-    # Get cases from database
     session = Session()
     cases = session.query(Case).all()
-    case_data = [case.to_dict() for case in cases]
+    case_data = [dict(case.to_dict(), id=case.id) for case in cases]
     session.close()
-    
-    if not case_data:
-        logger.error("No case data found in database")
-        return
-    
-    # Prepare training data
-    logger.info("Preparing training data...")
-    train_df, val_df = data_service.prepare_training_data(case_data)
-    
-    # Save processed data
-    data_service.save_training_data(train_df, val_df)
-    
-    # Convert to HuggingFace datasets
-    train_dataset = Dataset.from_pandas(train_df)
-    val_dataset = Dataset.from_pandas(val_df)
-    
-    # Initialize model and tokenizer
-    model_path = os.getenv('MODEL_PATH', 'models/legal_bert_model')
-    ml_service = MLService(model_path)
-    
-    # Tokenize the datasets
+    return case_data
+
+def tokenize_dataset(tokenizer, dataset, max_length=256):
+    """Tokenize a dataset of processed case text and format it for PyTorch."""
     def tokenize_function(examples):
-        return ml_service.tokenizer(
+        return tokenizer(
             examples['processed_text'],
             padding='max_length',
             truncation=True,
-            max_length=256
+            max_length=max_length
         )
     
-    train_dataset = train_dataset.map(tokenize_function, batched=True, batch_size=4)
-    val_dataset = val_dataset.map(tokenize_function, batched=True, batch_size=4)
+    dataset = dataset.map(tokenize_function, batched=True, batch_size=4)
+    dataset.set_format(type='torch', columns=['input_ids', 'attention_mask', 'label'])
+    return dataset
+
+class DistillationTrainer(Trainer):
+    """Trainer that mixes the hard-label loss with a soft-target loss from a teacher."""
     
-    # Set the format for PyTorch
-    train_dataset.set_format(type='torch', columns=['input_ids', 'attention_mask', 'label'])
-    val_dataset.set_format(type='torch', columns=['input_ids', 'attention_mask', 'label'])
+    def __init__(self, *args, teacher_model=None, temperature=2.0, alpha=0.5, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.teacher_model = teacher_model
+        self.teacher_model.eval()
+        self.temperature = temperature
+        self.alpha = alpha
     
-    # Prepare training arguments
-    training_args = TrainingArguments(
-        output_dir='./results',
+    def compute_loss(self, model, inputs, return_outputs=False):
+        outputs = model(**inputs)
+        
+        with torch.no_grad():
+            teacher_logits = self.teacher_model(**inputs).logits
+        
+        # KL divergence between temperature-softened distributions, scaled by T^2
+        # so its gradient magnitude stays comparable to the hard-label loss
+        t = self.temperature
+        soft_loss = F.kl_div(
+            F.log_softmax(outputs.logits / t, dim=-1),
+            F.softmax(teacher_logits / t, dim=-1),
+            reduction='batchmean'
+        ) * (t ** 2)
+        
+        loss = self.alpha * outputs.loss + (1 - self.alpha) * soft_loss
+        return (loss, outputs) if return_outputs else loss
+
+def build_training_args(output_dir: str = './results', **overrides) -> TrainingArguments:
+    """Training arguments shared by the full model and the distilled student.
+    
+    Keyword overrides replace individual defaults, e.g. a lower learning rate
+    for incremental fine-tuning.
+    """
+    options = dict(
+        output_dir=output_dir,
         num_train_epochs=3,
         per_device_train_batch_size=1,
         per_device_eval_batch_size=1,
@@ -97,10 +116,282 @@ def main():
         no_cuda=True,
         use_mps_device=False
     )
+    options.update(overrides)
+    return TrainingArguments(**options)
+
+def build_student_model(num_layers: int):
+    """Create a shallow legal-bert initialised from the first `num_layers` encoder layers."""
+    config = AutoConfig.from_pretrained(BASE_MODEL, num_labels=3, num_hidden_layers=num_layers)
+    return AutoModelForSequenceClassification.from_pretrained(
+        BASE_MODEL,
+        config=config,
+        torch_dtype=torch.float32
+    )
+
+def build_base_model():
+    """Fresh legal-bert classifier from the base checkpoint, for a full retrain."""
+    return AutoModelForSequenceClassification.from_pretrained(
+        BASE_MODEL,
+        num_labels=3,
+        torch_dtype=torch.float32
+    )
+
+def load_trained_model(ml_service, model_path):
+    """Load the fine-tuned full model, falling back to the service's base model."""
+    if os.path.isdir(model_path):
+        return AutoModelForSequenceClassification.from_pretrained(
+            model_path,
+            torch_dtype=torch.float32
+        )
+    logger.warning(f"No trained model found at {model_path}; using the base checkpoint")
+    return ml_service.model
+
+def current_model_path(model_path):
+    """Directory of the serving model: the registry's current version, else `model_path`."""
+    registry = ModelRegistry(os.getenv('MODEL_REGISTRY_PATH', 'models/registry'))
+    version = registry.current_version()
+    return registry.version_path(version) if version else model_path
+
+def train_student(ml_service, model_path, train_dataset, val_dataset, args):
+    """Distill the serving full model into a shallow student.
+    
+    When the registry has a current version the student is saved inside it,
+    so it is served and hot-swapped together with that version.
+    """
+    serving_path = current_model_path(model_path)
+    if not os.path.isdir(serving_path):
+        # An untrained teacher would only teach the student random logits
+        logger.error(f"No trained model found at {serving_path}; train the full model first")
+        return
+    student_path = os.path.join(serving_path, 'student') if serving_path != model_path else args.student_path
+    teacher = load_trained_model(ml_service, serving_path)
+    
+    student = build_student_model(args.student_layers)
+    logger.info(f"Distilling into a {args.student_layers}-layer student...")
+    
+    trainer = DistillationTrainer(
+        model=student,
+        args=build_training_args('./results_student'),
+        train_dataset=train_dataset,
+        eval_dataset=val_dataset,
+        compute_metrics=compute_metrics,
+        teacher_model=teacher,
+        temperature=args.temperature,
+        alpha=args.alpha
+    )
+    
+    trainer.train()
+    
+    metrics = trainer.evaluate()
+    logger.info(f"Student evaluation metrics: {metrics}")
+    
+    logger.info(f"Saving student model to {student_path}...")
+    trainer.save_model(student_path)
+
+def train_exit_heads(ml_service, model_path, train_dataset, val_dataset, args):
+    """Train classifier heads on intermediate layers of the frozen serving model.
+    
+    When the registry has a current version the heads are saved inside it as
+    `exit_heads.pt`, which is where the server loads them from.
+    """
+    serving_path = current_model_path(model_path)
+    if not os.path.isdir(serving_path):
+        # Heads are only served alongside the fine-tuned weights they were trained on
+        logger.error(f"No trained model found at {serving_path}; train the full model first")
+        return
+    heads_path = os.path.join(serving_path, 'exit_heads.pt') if serving_path != model_path else args.exit_heads_path
+    model = load_trained_model(ml_service, serving_path)
+    model.eval()
+    for param in model.parameters():
+        param.requires_grad = False
+    
+    exit_layers = [int(layer) for layer in args.exit_layers.split(',') if layer.strip()]
+    num_layers = model.config.num_hidden_layers
+    exit_layers = [layer for layer in exit_layers if 0 < layer < num_layers]
+    if not exit_layers:
+        logger.error(f"No valid exit layers given (model has {num_layers} layers)")
+        return
+    
+    heads = {layer: ExitHead(model.config.hidden_size) for layer in exit_layers}
+    optimizer = torch.optim.AdamW(
+        [param for head in heads.values() for param in head.parameters()],
+        lr=args.exit_lr,
+        weight_decay=0.01
+    )
+    
+    def encode(batch):
+        with torch.no_grad():
+            outputs = model.bert(
+                input_ids=batch['input_ids'],
+                attention_mask=batch['attention_mask'],
+                output_hidden_states=True
+            )
+        # hidden_states[0] is the embedding output, so layer N is at index N
+        return outputs.hidden_states
+    
+    logger.info(f"Training exit heads on layers {exit_layers}...")
+    train_loader = DataLoader(train_dataset, batch_size=8, shuffle=True)
+    for epoch in range(args.exit_epochs):
+        for head in heads.values():
+            head.train()
+        total_loss = 0.0
+        for batch in train_loader:
+            hidden_states = encode(batch)
+            loss = sum(
+                F.cross_entropy(head(hidden_states[layer]), batch['label'])
+                for layer, head in heads.items()
+            )
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            total_loss += loss.item()
+        logger.info(f"Epoch {epoch + 1}: loss {total_loss / max(len(train_loader), 1):.4f}")
+    
+    # Per-layer validation accuracy shows how much each exit gives up
+    val_loader = DataLoader(val_dataset, batch_size=8)
+    preds = {layer: [] for layer in heads}
+    labels = []
+    for head in heads.values():
+        head.eval()
+    with torch.no_grad():
+        for batch in val_loader:
+            hidden_states = encode(batch)
+            labels.extend(batch['label'].tolist())
+            for layer, head in heads.items():
+                preds[layer].extend(head(hidden_states[layer]).argmax(-1).tolist())
+    for layer in exit_layers:
+        logger.info(f"Exit head layer {layer}: accuracy {accuracy_score(labels, preds[layer]):.4f}")
+    
+    logger.info(f"Saving exit heads to {heads_path}...")
+    os.makedirs(os.path.dirname(heads_path) or '.', exist_ok=True)
+    torch.save({
+        'hidden_size': model.config.hidden_size,
+        'num_labels': 3,
+        'heads': {layer: head.state_dict() for layer, head in heads.items()}
+    }, heads_path)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Train the verdict prediction model.')
+    parser.add_argument('--distill', action='store_true',
+                        help='Distill the trained model into a shallow student for the cascade fast path')
+    parser.add_argument('--student-layers', type=int,
+                        default=int(os.getenv('STUDENT_NUM_LAYERS', '4')),
+                        help='Number of encoder layers kept in the student')
+    parser.add_argument('--student-path',
+                        default=os.getenv('STUDENT_MODEL_PATH', 'models/legal_bert_student'),
+                        help='Where to save the distilled student when no registry version is current')
+    parser.add_argument('--temperature', type=float, default=2.0,
+                        help='Softmax temperature for the distillation targets')
+    parser.add_argument('--alpha', type=float, default=0.5,
+                        help='Weight of the hard-label loss versus the distillation loss')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Resume from the current model and train only on cases added or '
+                             'relabelled since the last run')
+    parser.add_argument('--replay-ratio', type=float, default=0.5,
+                        help='Older cases replayed per new case in incremental mode')
+    parser.add_argument('--incremental-epochs', type=float, default=1,
+                        help='Training epochs in incremental mode')
+    parser.add_argument('--incremental-lr', type=float, default=2e-5,
+                        help='Learning rate in incremental mode')
+    parser.add_argument('--no-promote', action='store_true',
+                        help='Register the trained model without making it the serving version')
+    parser.add_argument('--early-exit', action='store_true',
+                        help='Train early-exit heads on intermediate layers of the trained model')
+    parser.add_argument('--exit-layers',
+                        default=os.getenv('EARLY_EXIT_LAYERS', '2,4,6,8,10'),
+                        help='Comma-separated encoder layers to attach exit heads to')
+    parser.add_argument('--exit-heads-path',
+                        default=os.getenv('EARLY_EXIT_HEADS_PATH', 'models/legal_bert_exit_heads.pt'),
+                        help='Where to save the exit heads when no registry version is current')
+    parser.add_argument('--exit-epochs', type=int, default=3,
+                        help='Training epochs for the exit heads')
+    parser.add_argument('--exit-lr', type=float, default=1e-3,
+                        help='Learning rate for the exit heads')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    
+    # Initialize services
+    data_service = DataService()
+    
+    # Get cases from database
+    case_data = load_case_data()
+    
+    if not case_data:
+        logger.error("No case data found in database")
+        return
+    
+    # In incremental mode, train only on what changed since the last run plus a replay sample
+    incremental = False
+    if args.incremental:
+        watermark = data_service.load_watermark()
+        current_version = ModelRegistry(os.getenv('MODEL_REGISTRY_PATH', 'models/registry')).current_version()
+        if watermark is None:
+            logger.warning("No training watermark found; running a full training instead")
+        elif watermark.get('model_version') != current_version:
+            # The watermark's cases were trained into a different lineage than the one being
+            # served, so resuming from CURRENT would skip cases it has never seen
+            logger.error(f"The training watermark belongs to model version {watermark.get('model_version')} "
+                         f"but the registry serves {current_version}; run a full training instead")
+            return
+        else:
+            new_cases, replay_cases = data_service.select_incremental_cases(
+                case_data, watermark, replay_ratio=args.replay_ratio
+            )
+            if not new_cases:
+                logger.info("No cases added or relabelled since the last run; nothing to train")
+                return
+            logger.info(f"Incremental training on {len(new_cases)} new/relabelled cases "
+                        f"plus {len(replay_cases)} replayed cases")
+            incremental = True
+    
+    # Prepare training data
+    logger.info("Preparing training data...")
+    if incremental:
+        train_df, val_df = data_service.prepare_incremental_data(new_cases, replay_cases)
+    else:
+        train_df, val_df = data_service.prepare_training_data(case_data)
+    
+    # Save processed data
+    data_service.save_training_data(train_df, val_df)
+    
+    # Convert to HuggingFace datasets
+    train_dataset = Dataset.from_pandas(train_df)
+    val_dataset = Dataset.from_pandas(val_df)
+    
+    # Initialize model and tokenizer
+    model_path = os.getenv('MODEL_PATH', 'models/legal_bert_model')
+    ml_service = MLService(model_path)
+    
+    # Tokenize the datasets and set the format for PyTorch
+    train_dataset = tokenize_dataset(ml_service.tokenizer, train_dataset)
+    val_dataset = tokenize_dataset(ml_service.tokenizer, val_dataset)
+    
+    if args.distill:
+        train_student(ml_service, model_path, train_dataset, val_dataset, args)
+        return
+    
+    if args.early_exit:
+        train_exit_heads(ml_service, model_path, train_dataset, val_dataset, args)
+        return
+    
+    # Prepare training arguments
+    if incremental:
+        model = load_trained_model(ml_service, current_model_path(model_path))
+        training_args = build_training_args(
+            num_train_epochs=args.incremental_epochs,
+            learning_rate=args.incremental_lr,
+            warmup_steps=0
+        )
+    else:
+        # MLService serves the fine-tuned model when one exists; a full run starts from the base
+        model = build_base_model()
+        training_args = build_training_args()
     
     # Initialize trainer
     trainer = Trainer(
-        model=ml_service.model,
+        model=model,
         args=training_args,
         train_dataset=train_dataset,
         eval_dataset=val_dataset,
@@ -119,6 +410,19 @@ def main():
     # Save the model
     logger.info("Saving model...")
     trainer.save_model(model_path)
+    ml_service.tokenizer.save_pretrained(model_path)
+    
+    # Register a new version so running servers can hot-swap it in
+    registry = ModelRegistry(os.getenv('MODEL_REGISTRY_PATH', 'models/registry'))
+    version = registry.register(model_path, promote=not args.no_promote)
+    logger.info(f"Registered model version {version}" + ("" if args.no_promote else " as current"))
+    
+    # Advance the watermark only after the model is safely saved and serving,
+    # since incremental runs resume from the registry's current version
+    if args.no_promote:
+        logger.info("Model not promoted; leaving the training watermark unchanged")
+    else:
+        data_service.save_watermark(case_data, model_version=version)
     
     # Export training data for reference
     data_service.export_model_data(case_data, format='json')
@@ -132,4 +436,4 @@ def main():
     logger.info(f"Average confidence: {stats['avg_confidence']:.2f}")
 
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    main()